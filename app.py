@@ -2,75 +2,76 @@ import dash
 import dash_table
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, ClientsideFunction
 
+import os
 import json
-import datetime
+import time
+import bisect
+import numpy as np
 import pandas as pd
 
-# Read in Contributor data
-with open("./data/contributors.json", "r") as f:
-    data_contributors = json.load(f)
-# Read in Contributor list
-with open("./data/contributor_list.json", "r") as f:
-    contributor_list = json.load(f)
-# Read in Team data
-with open("./data/teams.json", "r") as f:
-    data_teams = json.load(f)
-# Read in Contribution data
-with open("./data/contributions.json", "r") as f:
-    data_contributions = json.load(f)
-
-# Construct pandas DataFrame
-contributions_df = pd.DataFrame(data=data_contributions)
-# Add datetime dates as pandas column
-datetime_dates = list(
-    map(
-        lambda d: datetime.datetime.strptime(d, "%Y-%m-%d"), list(contributions_df.date)
-    )
+import dataset
+import binning
+import table_query
+from result_cache import ResultCache
+from callback_metrics import CallbackMetrics
+
+startup_start = time.perf_counter()
+
+# Read in Contributor data, Contributor list, Team data and Contribution data
+# It's prepared once for each version of the data and then loaded from a snapshot
+# When gatherData.py finishes a run, the new data is prepared in the background
+# and swapped in. Callbacks read live_data.current once, so each one uses a
+# single version of the data from start to finish
+live_data = dataset.LiveData("./data", int(os.getenv("RELOAD_INTERVAL", 30)))
+
+# Most points drawn in a graph, longer ranges are binned by week or by month
+GRAPH_POINTS = int(os.getenv("GRAPH_POINTS", 400))
+# Graphs with more points than this are drawn with WebGL, it has to be below
+# GRAPH_POINTS for any graph to be
+WEBGL_POINTS = int(os.getenv("WEBGL_POINTS", 300))
+
+# Callback results are cached for each version of the data
+# CACHE_DIR optionally shares them with other server processes
+result_cache = ResultCache(
+    lambda: live_data.current["version"],
+    int(os.getenv("CACHE_ENTRIES", 256)),
+    int(os.getenv("CACHE_BYTES", 64 * 1024 * 1024)),
+    os.path.join(os.getenv("CACHE_DIR"), "results.sqlite")
+    if os.getenv("CACHE_DIR")
+    else None,
 )
-contributions_df["datetime_date"] = datetime_dates
-# Add is_weekend to pandas column
-def is_weekday_func(date):
-    if date.weekday() < 5:
-        return True
-    else:
-        return False
-
-
-is_weekday_list = list(map(is_weekday_func, list(contributions_df.datetime_date)))
-contributions_df["is_weekday"] = is_weekday_list
-
-# Get list of repos, teams, and contributors
-repo_list = list(data_contributors.keys())
-team_list = list(data_teams.keys())
-
-# Convert list to options
-repo_list_options = [{"label": "All", "value": "All"}] + [
-    {"label": repo, "value": repo} for repo in repo_list
-]
-team_list_options = [{"label": "All", "value": "All"}] + [
-    {"label": team, "value": team} for team in team_list
-]
-
-# Get dates for DatePickerRange
-min_date = contributions_df.datetime_date.min()
-max_date = contributions_df.datetime_date.max()
-# Get a list of days, datetime, and string format, with and without weekends
-def datetime_list_to_string_list(date_list):
-    return list(
-        map(lambda date: datetime.datetime.strftime(date, "%Y-%m-%d"), date_list)
-    )
 
+# Latency and payload size of the callbacks, at /metrics
+# SLOW_CALLBACK_SECONDS logs slower callbacks and their inputs to SLOW_CALLBACK_LOG
+callback_metrics = CallbackMetrics(
+    float(os.getenv("SLOW_CALLBACK_SECONDS"))
+    if os.getenv("SLOW_CALLBACK_SECONDS")
+    else None,
+    os.getenv("SLOW_CALLBACK_LOG", "slow_callbacks.jsonl"),
+)
 
-datetime_days = [
-    min_date + datetime.timedelta(days=i) for i in range((max_date - min_date).days + 1)
-]
-all_days_list = datetime_list_to_string_list(datetime_days)
-weekdays_only_list = datetime_list_to_string_list(
-    filter(is_weekday_func, datetime_days)
+print(
+    "Loaded {} contributions in {:.2f}s ({})".format(
+        len(live_data.current["contributions_df"].index),
+        time.perf_counter() - startup_start,
+        "from snapshot" if live_data.from_snapshot else "prepared",
+    )
 )
 
+
+# Gets the positions in all_days_list of the days to graph
+# Dates are compared as strings, the same way the DataFrame is filtered
+def graph_day_offsets(data, start_date, end_date, include_weekends):
+    start = bisect.bisect_left(data["all_days_list"], start_date)
+    end = bisect.bisect_right(data["all_days_list"], end_date)
+    if include_weekends:
+        return np.arange(start, end)
+    weekday_offsets = data["weekday_offsets"]
+    return weekday_offsets[(weekday_offsets >= start) & (weekday_offsets < end)]
+
+
 # ======================
 # Dash app
 # ======================
@@ -121,16 +122,16 @@ def build_tabs():
     )
 
 
-def build_date_picker_range(id):
+def build_date_picker_range(id, data):
     return html.Div(
         children=[
             html.P("Time Period", className="control_label"),
             dcc.DatePickerRange(
                 id=id,
-                min_date_allowed=min_date,
-                max_date_allowed=max_date,
-                start_date=min_date,
-                end_date=max_date,
+                min_date_allowed=data["min_date"],
+                max_date_allowed=data["max_date"],
+                start_date=data["min_date"],
+                end_date=data["max_date"],
             ),
         ]
     )
@@ -164,23 +165,29 @@ def build_contribution_type_dropdown(id):
     )
 
 
-def build_repository_dropdown(id):
+def build_repository_dropdown(id, data):
     return html.Div(
         children=[
             html.P("Repository", className="control_label"),
             dcc.Dropdown(
-                id=id, className="dcc_control", value="All", options=repo_list_options
+                id=id,
+                className="dcc_control",
+                value="All",
+                options=data["repo_list_options"],
             ),
         ]
     )
 
 
-def build_team_dropdown(id):
+def build_team_dropdown(id, data):
     return html.Div(
         children=[
             html.P("Team", className="control_label"),
             dcc.Dropdown(
-                id=id, value="All", className="dcc_control", options=team_list_options
+                id=id,
+                value="All",
+                className="dcc_control",
+                options=data["team_list_options"],
             ),
         ]
     )
@@ -199,6 +206,27 @@ def build_contribution_graph_layout(title):
     )
 
 
+# Builds the figure of a contribution graph from the counts of every day
+# Days are binned by week or month when there are more than GRAPH_POINTS of them
+def build_contribution_graph(title, data, day_offsets, day_counts):
+    period, bin_offsets, bin_counts = binning.bin_counts(
+        day_offsets, day_counts, data["period_keys"], GRAPH_POINTS
+    )
+    if period != "day":
+        title = "{} per {}".format(title, period)
+    trace = dict(
+        type="scatter",
+        mode="line",
+        x=data["all_days_array"][bin_offsets].tolist(),
+        y=bin_counts.tolist(),
+        line=dict(shape="spline", smoothing="0.5"),
+    )
+    if len(bin_offsets) > WEBGL_POINTS:
+        # WebGL traces can't draw splines
+        trace.update(type="scattergl", line=dict(shape="linear"))
+    return dict(data=[trace], layout=build_contribution_graph_layout(title))
+
+
 def build_graph(id, title):
     return html.Div(
         className="pretty_container eight columns",
@@ -208,7 +236,22 @@ def build_graph(id, title):
     )
 
 
-def build_table(id, columns=[]):
+# With custom, paging, sorting and filtering are done by a callback, and only
+# the rows of the current page are sent to the browser
+def build_table(id, columns=[], custom=False):
+    if custom:
+        return dash_table.DataTable(
+            id=id,
+            page_size=10,
+            page_current=0,
+            page_action="custom",
+            sort_action="custom",
+            sort_mode="single",
+            sort_by=[],
+            filter_action="custom",
+            filter_query="",
+            columns=columns,
+        )
     return dash_table.DataTable(
         id=id,
         page_size=10,
@@ -218,162 +261,157 @@ def build_table(id, columns=[]):
     )
 
 
-def build_user_dropdown(id):
+def build_user_dropdown(id, data):
     return html.Div(
         children=[
             html.P("Select User", className="control_label"),
-            dcc.Dropdown(
-                id=id,
-                className="dcc_control",
-                options=[
-                    {
-                        "label": contributor["name"]
-                        if contributor["name"]
-                        else contributor["login"],
-                        "value": contributor["login"],
-                    }
-                    for contributor in contributor_list
-                ],
-            ),
+            dcc.Dropdown(id=id, className="dcc_control", options=data["user_options"]),
         ]
     )
 
 
 # Tabs
-overview_tab = [
-    # Controls and Graph
-    html.Div(
-        className="row flex_display",
-        children=[
-            # Controls
-            html.Div(
-                className="pretty_container four columns",
-                children=[
-                    build_date_picker_range("all_contribution_date"),
-                    build_include_weekends_checkbox("all_include_weekends"),
-                    build_contribution_type_dropdown("all_contribution_type"),
-                    build_repository_dropdown("all_repo"),
-                    build_team_dropdown("all_team"),
-                ],
-            ),
-            build_graph("all_contribution_graph", "All Contributions"),
-        ],
-    ),
-    # Table
-    html.Div(
-        className="row flex_display",
-        children=html.Div(
-            className="pretty_container twelve columns",
+# Built each time a tab is opened, from the data being served at the time
+def build_overview_tab(data):
+    return [
+        # Controls and Graph
+        html.Div(
+            className="row flex_display",
             children=[
-                # Title
-                html.H4("Contributions Table", className="inline_control_label"),
-                # Has Contributed or not
-                dcc.RadioItems(
-                    id="all_show_contributions",
-                    className="inline_radio",
-                    options=[
-                        {"label": "Contributions", "value": "contributions"},
-                        {
-                            "label": "People who Haven't Contributed",
-                            "value": "no_contributions",
-                        },
+                # Controls
+                html.Div(
+                    className="pretty_container four columns",
+                    children=[
+                        build_date_picker_range("all_contribution_date", data),
+                        build_include_weekends_checkbox("all_include_weekends"),
+                        build_contribution_type_dropdown("all_contribution_type"),
+                        build_repository_dropdown("all_repo", data),
+                        build_team_dropdown("all_team", data),
                     ],
-                    value="contributions",
                 ),
-                build_table("all_contribution_table"),
+                build_graph("all_contribution_graph", "All Contributions"),
             ],
         ),
-    ),
-]
-
-
-users_tab = [
-    dcc.Store(id="users_repo_list", data=[]),
-    html.Div(
-        className="row flex_display",
-        children=[
-            html.Div(
-                className="pretty_container four columns",
+        # Table
+        html.Div(
+            className="row flex_display",
+            children=html.Div(
+                className="pretty_container twelve columns",
                 children=[
-                    build_user_dropdown("users_person"),
-                    build_include_weekends_checkbox("users_include_weekends"),
-                    build_contribution_type_dropdown("users_contribution_type"),
-                    build_repository_dropdown("users_repo"),
-                    build_date_picker_range("users_contribution_date"),
+                    # Title
+                    html.H4("Contributions Table", className="inline_control_label"),
+                    # Has Contributed or not
+                    dcc.RadioItems(
+                        id="all_show_contributions",
+                        className="inline_radio",
+                        options=[
+                            {"label": "Contributions", "value": "contributions"},
+                            {
+                                "label": "People who Haven't Contributed",
+                                "value": "no_contributions",
+                            },
+                        ],
+                        value="contributions",
+                    ),
+                    build_table("all_contribution_table", custom=True),
                 ],
             ),
-            build_graph("users_contribution_graph", "User Contributions"),
-        ],
-    ),
-    html.Div(
-        className="row flex_display",
-        children=html.Div(
-            className="pretty_container twelve columns",
+        ),
+    ]
+
+
+def build_users_tab(data):
+    return [
+        dcc.Store(id="users_contributions"),
+        html.Div(
+            className="row flex_display",
             children=[
-                # Title
-                html.H4("Contributions Table", className="inline_control_label"),
-                build_table(
-                    "users_contribution_table",
-                    columns=[
-                        {"name": col, "id": col}
-                        for col in contributions_df.columns[:-1]
+                html.Div(
+                    className="pretty_container four columns",
+                    children=[
+                        build_user_dropdown("users_person", data),
+                        build_include_weekends_checkbox("users_include_weekends"),
+                        build_contribution_type_dropdown("users_contribution_type"),
+                        build_repository_dropdown("users_repo", data),
+                        build_date_picker_range("users_contribution_date", data),
                     ],
                 ),
+                build_graph("users_contribution_graph", "User Contributions"),
             ],
         ),
-    ),
-    html.Div(
-        className="row flex_display",
-        children=[
-            html.Div(
-                className="pretty_container six columns",
+        html.Div(
+            className="row flex_display",
+            children=html.Div(
+                className="pretty_container twelve columns",
                 children=[
                     # Title
-                    html.H4("Teams User is on", className="inline_control_label"),
-                    build_table(
-                        "users_teams_table", columns=[{"name": "Team", "id": "team"}]
-                    ),
-                ],
-            ),
-            html.Div(
-                className="pretty_container six columns",
-                children=[
-                    # Title
-                    html.H4(
-                        "Repositories User has access to",
-                        className="inline_control_label",
-                    ),
+                    html.H4("Contributions Table", className="inline_control_label"),
                     build_table(
-                        "users_repositories_table",
-                        columns=[{"name": "Repository", "id": "repository"}],
+                        "users_contribution_table",
+                        columns=[
+                            {"name": col, "id": col}
+                            for col in data["contributions_df"].columns[:-1]
+                        ],
                     ),
                 ],
             ),
-        ],
-    ),
-]
+        ),
+        html.Div(
+            className="row flex_display",
+            children=[
+                html.Div(
+                    className="pretty_container six columns",
+                    children=[
+                        # Title
+                        html.H4("Teams User is on", className="inline_control_label"),
+                        build_table(
+                            "users_teams_table", columns=[{"name": "Team", "id": "team"}]
+                        ),
+                    ],
+                ),
+                html.Div(
+                    className="pretty_container six columns",
+                    children=[
+                        # Title
+                        html.H4(
+                            "Repositories User has access to",
+                            className="inline_control_label",
+                        ),
+                        build_table(
+                            "users_repositories_table",
+                            columns=[{"name": "Repository", "id": "repository"}],
+                        ),
+                    ],
+                ),
+            ],
+        ),
+    ]
 
-repositories_tab = [
-    html.Div(
-        className="row flex_display",
-        children=[
-            html.Div(
-                className="pretty_container four columns",
-                children=[
-                    build_repository_dropdown("repos_repo"),
-                    build_include_weekends_checkbox("repos_include_weekends"),
-                    build_contribution_type_dropdown("repos_contribution_type"),
-                    build_user_dropdown("repos_person"),
-                    build_date_picker_range("repos_contribution_date"),
-                ],
-            ),
-            build_graph("repos_contribution_graph", "User Contributions"),
-        ],
-    )
-]
+def build_repositories_tab(data):
+    return [
+        html.Div(
+            className="row flex_display",
+            children=[
+                html.Div(
+                    className="pretty_container four columns",
+                    children=[
+                        build_repository_dropdown("repos_repo", data),
+                        build_include_weekends_checkbox("repos_include_weekends"),
+                        build_contribution_type_dropdown("repos_contribution_type"),
+                        build_user_dropdown("repos_person", data),
+                        build_date_picker_range("repos_contribution_date", data),
+                    ],
+                ),
+                build_graph("repos_contribution_graph", "User Contributions"),
+            ],
+        )
+    ]
 
 app = dash.Dash(__name__, external_stylesheets=["./assets/styles.css"])
 app.config["suppress_callback_exceptions"] = True
+# For WSGI servers running several worker processes, e.g. gunicorn app:server
+server = app.server
+callback_metrics.attach(app)
 
 # Page
 app.layout = html.Div(
@@ -382,23 +420,99 @@ app.layout = html.Div(
 
 # Tab navigation
 @app.callback(Output("tab_content", "children"), [Input("tabs", "value")])
+@callback_metrics.measure
 def display_content(tab):
+    data = live_data.current
     if tab == "overview":
-        return overview_tab
+        return build_overview_tab(data)
     elif tab == "users":
-        return users_tab
+        return build_users_tab(data)
     elif tab == "repositories":
-        return repositories_tab
+        return build_repositories_tab(data)
 
 
 # ======================
 # All Contributions
 # ======================
 
-# Graph and Table
+# Filters the contributions and contributors for the Overview tab
+def filter_all_contributions(
+    data, start_date, end_date, include_weekends, contribution_type, repo, team
+):
+    membership = data["membership"]
+    # Filter df
+    contributions = data["contributions_df"]
+    contributors = data["contributor_list"]
+    # Filter by Include Weekends
+    if not include_weekends:
+        contributions = contributions[contributions.is_weekday == True]
+    # Filter by date
+    contributions = contributions[
+        table_query.filter_mask(contributions.date, "ge", start_date)
+        & table_query.filter_mask(contributions.date, "le", end_date)
+    ]
+    # Filter by Contribution Type
+    if contribution_type != "All":
+        contributions = contributions[
+            contributions.contribution_type == contribution_type
+        ]
+    # Filter by Repository
+    if repo != "All":
+        contributions = contributions[contributions.repo_name == repo]
+        repo_users_logins = membership.repo_members(repo)
+        contributors = [
+            contributor
+            for contributor in contributors
+            if contributor["login"] in repo_users_logins
+        ]
+    # Filter by Team
+    if team != "All":
+        team_users_logins = membership.team_members(team)
+        contributions = contributions[
+            contributions.contributor_login.isin(list(team_users_logins))
+        ]
+        contributors = [
+            contributor
+            for contributor in contributors
+            if contributor["login"] in team_users_logins
+        ]
+    return contributions, contributors
+
+
+# Graph
+@app.callback(
+    Output("all_contribution_graph", "figure"),
+    [
+        Input("all_contribution_date", "start_date"),
+        Input("all_contribution_date", "end_date"),
+        Input("all_include_weekends", "value"),
+        Input("all_contribution_type", "value"),
+        Input("all_repo", "value"),
+        Input("all_team", "value"),
+    ],
+)
+@callback_metrics.measure
+@result_cache.memoize
+def update_all_contrib(
+    start_date, end_date, include_weekends, contribution_type, repo, team
+):
+    data = live_data.current
+    # Get number of contributions for each date
+    with callback_metrics.phase("filter"):
+        day_offsets = graph_day_offsets(data, start_date, end_date, include_weekends)
+    with callback_metrics.phase("aggregate"):
+        day_counts = data["contribution_cube"].counts(contribution_type, repo, team)
+        # Set graph output
+        return build_contribution_graph(
+            "All Contributions", data, day_offsets, day_counts
+        )
+
+
+# Table
+# Only the page being looked at is sent to the browser, after it has been
+# filtered and sorted here
 @app.callback(
     [
-        Output("all_contribution_graph", "figure"),
         Output("all_contribution_table", "data"),
         Output("all_contribution_table", "columns"),
     ],
@@ -410,9 +524,15 @@ def display_content(tab):
         Input("all_repo", "value"),
         Input("all_team", "value"),
         Input("all_show_contributions", "value"),
+        Input("all_contribution_table", "page_current"),
+        Input("all_contribution_table", "page_size"),
+        Input("all_contribution_table", "sort_by"),
+        Input("all_contribution_table", "filter_query"),
     ],
 )
-def update_all_contrib(
+@callback_metrics.measure
+@result_cache.memoize
+def update_all_table(
     start_date,
     end_date,
     include_weekends,
@@ -420,76 +540,41 @@ def update_all_contrib(
     repo,
     team,
     show_contributions,
+    page_current,
+    page_size,
+    sort_by,
+    filter_query,
 ):
-    # Layout
-    layout = build_contribution_graph_layout("All Contributions")
-    # Filter df
-    contributions = contributions_df
-    dates = all_days_list
-    contributors = contributor_list
-    # Filter by Include Weekends
-    if not include_weekends:
-        contributions = contributions[contributions.is_weekday == True]
-        dates = weekdays_only_list
-    # Filter by date
-    dates = list(filter(lambda d: d >= start_date and d <= end_date, dates))
-    contributions = contributions[
-        (contributions.date >= start_date) & (contributions.date <= end_date)
-    ]
-    # Filter by Contribution Type
-    if contribution_type != "All":
-        contributions = contributions[
-            contributions.contribution_type == contribution_type
-        ]
-    # Filter by Repository
-    if repo != "All":
-        contributions = contributions[contributions.repo_name == repo]
-        contributors = list(
-            filter(
-                lambda d: d in data_contributors[repo]["collaborators"], contributors
-            )
+    with callback_metrics.phase("filter"):
+        contributions, contributors = filter_all_contributions(
+            live_data.current,
+            start_date,
+            end_date,
+            include_weekends,
+            contribution_type,
+            repo,
+            team,
         )
-    # Filter by Team
-    if team != "All":
-        team_users_logins = [user["login"] for user in data_teams[team]["members"]]
-        contributions = contributions[
-            contributions.contributor_login.isin(team_users_logins)
-        ]
-        contributors = list(
-            filter(lambda d: d in data_teams[team]["members"], contributors)
-        )
-    # Get number of contributions for each date
-    contribution_num = [
-        len(contributions[contributions.date == date].index) for date in dates
-    ]
-    # Graph Data
-    data = [
-        dict(
-            type="scatter",
-            mode="line",
-            x=dates,
-            y=contribution_num,
-            line=dict(shape="spline", smoothing="0.5"),
-        )
-    ]
-    # Set graph output
-    graph_output = dict(data=data, layout=layout)
-
     # Set table output
     # [-1] to disclude the is_weekday column
     columns = [{"name": col, "id": col} for col in contributions.columns[:-1]]
-    table_output = contributions.to_dict("records")
+    table_rows = contributions
     if show_contributions == "no_contributions":
+        contributed_logins = set(contributions.contributor_login.unique())
         no_contribution_list = [
             contributor
             for contributor in contributors
-            if contributor["login"] not in contributions.contributor_login.unique()
+            if contributor["login"] not in contributed_logins
         ]
         # Set table data
-        table_output = no_contribution_list
+        table_rows = pd.DataFrame(no_contribution_list, columns=["name", "login"])
         # Set columns to only name and login
         columns = [{"name": col, "id": col} for col in ["name", "login"]]
-    return graph_output, table_output, columns
+    with callback_metrics.phase("aggregate"):
+        table_output = table_query.table_page(
+            table_rows, page_current, page_size, sort_by, filter_query
+        )
+    return table_output, columns
 
 
 # ======================
@@ -500,114 +585,125 @@ def update_all_contrib(
 @app.callback(
     Output("users_contribution_date", "start_date"), [Input("users_person", "value")]
 )
+@callback_metrics.measure
+@result_cache.memoize
 def update_calendar_start(user):
-    contributions = contributions_df[contributions_df.contributor_login == user]
+    data = live_data.current
+    contributions_df = data["contributions_df"]
+    with callback_metrics.phase("filter"):
+        contributions = contributions_df[contributions_df.contributor_login == user]
     if contributions.empty:
-        return min_date
-    user_first_contribution = contributions.date.min()
+        return data["min_date"]
+    with callback_metrics.phase("aggregate"):
+        user_first_contribution = contributions.date.min()
     return user_first_contribution
 
 
+# Repositories a user is a collaborator on, after "All"
+def user_repo_list(data, user):
+    with callback_metrics.phase("filter"):
+        return ["All"] + data["membership"].repos_of(user)
+
+
 # Repositories specific to user
+@app.callback(Output("users_repo", "options"), [Input("users_person", "value")])
+@callback_metrics.measure
+def create_user_repo_list(user):
+    repo_list = user_repo_list(live_data.current, user)
+    return [{"label": repo_name, "value": repo_name} for repo_name in repo_list]
+
+
+# Gets a user's contributions in the compact form the Users tab filters in the
+# browser (assets/users.js)
+# Repositories, types and dates are sent once each and every contribution is a
+# code into them, in the order of the contributions table
+def user_contributions_payload(data, user):
+    contributions_df = data["contributions_df"]
+    with callback_metrics.phase("filter"):
+        contributions = contributions_df[contributions_df.contributor_login == user]
+    with callback_metrics.phase("aggregate"):
+        repo_codes, repos = pd.factorize(contributions.repo_name.astype(object))
+        type_codes, types = pd.factorize(
+            contributions.contribution_type.astype(object)
+        )
+        date_codes, dates = pd.factorize(contributions.date.astype(object), sort=True)
+        names = contributions.contributor_name.dropna()
+    return {
+        "login": user,
+        "name": names.iloc[0] if len(names.index) else None,
+        "repos": list(repos),
+        "types": list(types),
+        "dates": list(dates),
+        "repo": repo_codes.tolist(),
+        "type": type_codes.tolist(),
+        "date": date_codes.tolist(),
+        # Every day the graphs can show
+        "min_date": data["all_days_list"][0] if data["all_days_list"] else None,
+        "day_count": len(data["all_days_list"]),
+        "graph_points": GRAPH_POINTS,
+        "webgl_points": WEBGL_POINTS,
+        "layout": build_contribution_graph_layout("User Contributions"),
+    }
+
+
+# User's contributions and Tables
+# The graph and the contributions table are filtered from the contributions in
+# the browser, so the other controls of the tab don't call the server
 @app.callback(
-    [Output("users_repo_list", "data"), Output("users_repo", "options")],
+    [
+        Output("users_contributions", "data"),
+        Output("users_teams_table", "data"),
+        Output("users_repositories_table", "data"),
+    ],
     [Input("users_person", "value")],
 )
-def create_user_repo_list(user):
-    repo_list = ["All"]
-    for repo_name, repo_content in data_contributors.items():
-        login_list = [
-            contributor["login"] for contributor in repo_content["collaborators"]
-        ]
-        if user in login_list:
-            repo_list.append(repo_name)
-    repo_list_options = [
-        {"label": repo_name, "value": repo_name} for repo_name in repo_list
+@callback_metrics.measure
+@result_cache.memoize
+def update_user_contrib(user):
+    data = live_data.current
+    contributions_output = user_contributions_payload(data, user)
+    # Teams Table
+    teams_table_output = [
+        {"team": team_name} for team_name in data["membership"].teams_of(user)
+    ]
+    # Repos Table
+    repos_table_output = [
+        {"repository": repo_name} for repo_name in user_repo_list(data, user)
     ]
-    return repo_list, repo_list_options
+    return contributions_output, teams_table_output, repos_table_output
 
 
-# Graph and Table
-@app.callback(
+# Graph and Contributions Table
+app.clientside_callback(
+    ClientsideFunction("users", "filter_contributions"),
     [
         Output("users_contribution_graph", "figure"),
         Output("users_contribution_table", "data"),
-        Output("users_teams_table", "data"),
-        Output("users_repositories_table", "data"),
     ],
     [
-        Input("users_person", "value"),
+        Input("users_contributions", "data"),
         Input("users_include_weekends", "value"),
         Input("users_contribution_type", "value"),
         Input("users_repo", "value"),
         Input("users_contribution_date", "start_date"),
         Input("users_contribution_date", "end_date"),
     ],
-    [State("users_repo_list", "data")],
 )
-def update_user_contrib(
-    user,
-    include_weekends,
-    contribution_type,
-    repo,
-    start_date,
-    end_date,
-    users_repo_list,
-):
-    # Layout
-    layout = build_contribution_graph_layout("User Contributions")
-    # Filter df
-    contributions = contributions_df[contributions_df.contributor_login == user]
-    dates = all_days_list
-    # Filter by Include Weekends
-    if not include_weekends:
-        contributions = contributions[contributions.is_weekday == True]
-        dates = weekdays_only_list
-    # Filter by date
-    dates = list(filter(lambda d: d >= start_date and d <= end_date, dates))
-    contributions = contributions[
-        (contributions.date >= start_date) & (contributions.date <= end_date)
-    ]
-    # Filter by Contribution Type
-    if contribution_type != "All":
-        contributions = contributions[
-            contributions.contribution_type == contribution_type
-        ]
-    # Filter by Repository
-    if repo != "All":
-        contributions = contributions[contributions.repo_name == repo]
-    # Get number of contributions for each date
-    contribution_num = [
-        len(contributions[contributions.date == date].index) for date in dates
-    ]
-    # Graph Data
-    data = [
-        dict(
-            type="scatter",
-            mode="line",
-            x=dates,
-            y=contribution_num,
-            line=dict(shape="spline", smoothing="0.5"),
-        )
-    ]
-    graph_output = dict(data=data, layout=layout)
 
-    # Set table output
-    contributions_table_output = contributions.to_dict("records")
 
-    # Teams Table
-    teams_table_output = []
-    for team_name, team_content in data_teams.items():
-        login_list = [team_member["login"] for team_member in team_content["members"]]
-        if user in login_list:
-            teams_table_output.append({"team": team_name})
-    # Repos Table
-    repos_table_output = [{"repository": repo_name} for repo_name in users_repo_list]
-    return (
-        graph_output,
-        contributions_table_output,
-        teams_table_output,
-        repos_table_output,
+# Cache hit and miss rates
+@app.server.route("/stats/cache")
+def cache_stats():
+    return app.server.response_class(
+        json.dumps(result_cache.stats()), mimetype="application/json"
+    )
+
+
+# Latency histograms, payload sizes and input cardinalities of the callbacks
+@app.server.route("/metrics")
+def metrics():
+    return app.server.response_class(
+        callback_metrics.prometheus_text(), mimetype="text/plain; version=0.0.4"
     )
 
 
@@ -0,0 +1,149 @@
+// Filtering for the Users tab, run in the browser
+// app.py sends one user's contributions to the users_contributions store when
+// the user is picked, and the graph and contributions table are filtered from
+// them here whenever another control of the tab changes
+
+// Periods the days of a graph can be grouped into, from the finest
+var PERIODS = ["day", "week", "month"];
+
+// Gets the YYYY-MM-DD date of a UTC Date
+function formatDate(date) {
+    return date.toISOString().slice(0, 10);
+}
+
+// Gets every day the graphs can show, with the week and month each is in
+// Weeks and months are numbers that increase with the date, like in binning.py
+function allDays(minDate, dayCount) {
+    var days = [];
+    var first = new Date(minDate + "T00:00:00Z");
+    for (var day = 0; day < dayCount; day++) {
+        var date = new Date(first.getTime() + day * 86400000);
+        // Monday is 0, as in pandas
+        var dayOfWeek = (date.getUTCDay() + 6) % 7;
+        days.push({
+            date: formatDate(date),
+            isWeekday: dayOfWeek < 5,
+            day: day,
+            week: day - dayOfWeek,
+            month: date.getUTCFullYear() * 12 + date.getUTCMonth()
+        });
+    }
+    return days;
+}
+
+// Sums daily counts into bins of days, weeks or months, using the finest period
+// that keeps the number of bins within maxPoints, like bin_counts in binning.py
+function binCounts(days, counts, maxPoints) {
+    var period, starts;
+    for (var i = 0; i < PERIODS.length; i++) {
+        period = PERIODS[i];
+        starts = [];
+        for (var j = 0; j < days.length; j++) {
+            if (j === 0 || days[j][period] !== days[j - 1][period]) {
+                starts.push(j);
+            }
+        }
+        if (starts.length <= maxPoints) {
+            break;
+        }
+    }
+    var x = [];
+    var y = [];
+    for (var k = 0; k < starts.length; k++) {
+        var end = k + 1 < starts.length ? starts[k + 1] : days.length;
+        var sum = 0;
+        for (var m = starts[k]; m < end; m++) {
+            sum += counts[m];
+        }
+        x.push(days[starts[k]].date);
+        y.push(sum);
+    }
+    return {period: period, x: x, y: y};
+}
+
+// Builds the graph figure, like build_contribution_graph in app.py
+function buildGraph(payload, days, counts) {
+    var bins = binCounts(days, counts, payload.graph_points);
+    var layout = Object.assign({}, payload.layout);
+    if (bins.period !== "day") {
+        layout.title = layout.title + " per " + bins.period;
+    }
+    var trace = {
+        type: "scatter",
+        mode: "line",
+        x: bins.x,
+        y: bins.y,
+        line: {shape: "spline", smoothing: "0.5"}
+    };
+    if (bins.x.length > payload.webgl_points) {
+        // WebGL traces can't draw splines
+        trace.type = "scattergl";
+        trace.line = {shape: "linear"};
+    }
+    return {data: [trace], layout: layout};
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    users: {
+        // Gets the graph figure and the contributions table rows
+        // Dates are compared as strings, the same way the server filters them
+        filter_contributions: function(
+            payload,
+            includeWeekends,
+            contributionType,
+            repo,
+            startDate,
+            endDate
+        ) {
+            if (!payload) {
+                return [{data: [], layout: {}}, []];
+            }
+            var weekends = Boolean(includeWeekends && includeWeekends.length);
+            var days = allDays(payload.min_date, payload.day_count).filter(
+                function(day) {
+                    return (
+                        (weekends || day.isWeekday) &&
+                        day.date >= startDate &&
+                        day.date <= endDate
+                    );
+                }
+            );
+            // Position of each graphed date in days
+            var dayPositions = {};
+            days.forEach(function(day, position) {
+                dayPositions[day.date] = position;
+            });
+            var counts = days.map(function() {
+                return 0;
+            });
+
+            var rows = [];
+            for (var i = 0; i < payload.date.length; i++) {
+                var contributionTypeValue = payload.types[payload.type[i]];
+                var repoName = payload.repos[payload.repo[i]];
+                if (
+                    (contributionType !== "All" &&
+                        contributionTypeValue !== contributionType) ||
+                    (repo !== "All" && repoName !== repo)
+                ) {
+                    continue;
+                }
+                var date = payload.dates[payload.date[i]];
+                if (!(date in dayPositions)) {
+                    continue;
+                }
+                counts[dayPositions[date]] += 1;
+                rows.push({
+                    contributor_login: payload.login,
+                    contributor_name: payload.name,
+                    repo_name: repoName,
+                    contribution_type: contributionTypeValue,
+                    date: date,
+                    datetime_date: date + "T00:00:00",
+                    is_weekday: days[dayPositions[date]].isWeekday
+                });
+            }
+            return [buildGraph(payload, days, counts), rows];
+        }
+    }
+});
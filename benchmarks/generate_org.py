@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import argparse
+import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import contribution_store
+
+# =====================================
+# Synthetic organization
+# =====================================
+
+"""
+Writes the data files gatherData.py would write for a made up organization, so
+the app can be measured without a real organization or API key
+
+Users are collaborators on a few repositories and members of a few teams. A few
+users make most of the contributions, mostly on weekdays, and always in the
+repositories they are collaborators on. The same seed and --last-day always
+make the same organization
+"""
+
+CONTRIBUTION_TYPES = ["Commit", "Issue", "PullRequest", "PullRequestReview"]
+# How often each type of contribution is made
+TYPE_WEIGHTS = [0.55, 0.1, 0.15, 0.2]
+# How much more often a contribution is made on a weekday than on a weekend day
+WEEKDAY_WEIGHT = 4
+# Fraction of users without a name
+NAMELESS = 0.1
+
+parser = argparse.ArgumentParser(description="Generate a synthetic GitHub organization")
+parser.add_argument("--users", type=int, default=1000)
+parser.add_argument("--repos", type=int, default=500)
+parser.add_argument("--teams", type=int, default=50)
+parser.add_argument("--contributions", type=int, default=500000)
+parser.add_argument("--years", type=int, default=1, help="years of contributions")
+parser.add_argument(
+    "--last-day",
+    default=datetime.datetime.utcnow().strftime("%Y-%m-%d"),
+    help="day of the last contributions (YYYY-MM-DD, default today in UTC, so "
+    "gatherData.py finds them in its last year)",
+)
+parser.add_argument(
+    "--repos-per-user", type=int, default=5, help="average repositories per user"
+)
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument(
+    "--output",
+    default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "org", "data"),
+    help="folder to write the data files to",
+)
+parser.add_argument(
+    "--no-json",
+    action="store_true",
+    help="only save the contributions in the columnar format, not contributions.json",
+)
+
+
+# Gets pairs of (user, group) with every user in about per_user groups and every
+# group with at least one user
+def memberships(random, user_count, group_count, per_user):
+    group_counts = np.minimum(
+        1 + random.poisson(max(per_user - 1, 0), user_count), group_count
+    )
+    users = np.repeat(np.arange(user_count), group_counts)
+    groups = random.randint(0, group_count, len(users))
+    # Every group gets one user, whoever is next in line
+    users = np.concatenate((users, np.arange(group_count) % user_count))
+    groups = np.concatenate((groups, np.arange(group_count)))
+    pairs = np.unique(users.astype(np.int64) * group_count + groups)
+    return pairs // group_count, pairs % group_count
+
+
+# Gets the users of each group, in order
+def group_users(group_count, users, groups):
+    order = np.lexsort((users, groups))
+    offsets = np.searchsorted(groups[order], np.arange(group_count + 1))
+    return [users[order][offsets[i] : offsets[i + 1]] for i in range(group_count)]
+
+
+def generate(args):
+    random = np.random.RandomState(args.seed)
+    user_count, repo_count, team_count = args.users, args.repos, args.teams
+
+    logins = ["user{}".format(i) for i in range(user_count)]
+    names = [
+        None if nameless else "User {}".format(i)
+        for i, nameless in enumerate(random.random_sample(user_count) < NAMELESS)
+    ]
+    users = [{"name": name, "login": login} for name, login in zip(names, logins)]
+    repo_names = ["repo-{}".format(i) for i in range(repo_count)]
+    team_names = ["team-{}".format(i) for i in range(team_count)]
+
+    # Repositories
+    collaborator_users, collaborator_repos = memberships(
+        random, user_count, repo_count, args.repos_per_user
+    )
+    data_contributors = {
+        repo_names[repo]: {"collaborators": [users[user] for user in repo_users]}
+        for repo, repo_users in enumerate(
+            group_users(repo_count, collaborator_users, collaborator_repos)
+        )
+    }
+    # Sorted by name like queries.to_dict
+    data_contributors = dict(
+        sorted(data_contributors.items(), key=lambda item: item[0].lower())
+    )
+
+    # Teams
+    data_teams = {}
+    if team_count:
+        member_users, member_teams = memberships(random, user_count, team_count, 2)
+        for team, team_users in enumerate(
+            group_users(team_count, member_users, member_teams)
+        ):
+            team_repos = random.choice(
+                repo_count, min(random.randint(1, 21), repo_count), replace=False
+            )
+            data_teams[team_names[team]] = {
+                "members": [users[user] for user in team_users],
+                "repositories": [
+                    {"name": repo_names[repo]} for repo in sorted(team_repos)
+                ],
+            }
+
+    data_teams = dict(sorted(data_teams.items(), key=lambda item: item[0].lower()))
+
+    # Every user is a collaborator, so every user is a contributor
+    contributor_list = sorted(
+        users, key=lambda d: d["name"].lower() if d["name"] else d["login"].lower()
+    )
+
+    # Contributions
+    # Users are ranked at random, and the user at rank r contributes about as
+    # often as 1 / (r + 1)
+    user_weights = 1 / (random.permutation(user_count) + 1.0)
+    contribution_users = random.choice(
+        user_count, args.contributions, p=user_weights / user_weights.sum()
+    )
+    # A repository the user is a collaborator on, picked at random
+    repo_offsets = np.searchsorted(collaborator_users, np.arange(user_count + 1))
+    user_repo_counts = np.diff(repo_offsets)
+    contribution_repos = collaborator_repos[
+        repo_offsets[contribution_users]
+        + (
+            random.random_sample(args.contributions)
+            * user_repo_counts[contribution_users]
+        ).astype(np.int64)
+    ]
+    contribution_types = random.choice(
+        len(CONTRIBUTION_TYPES), args.contributions, p=TYPE_WEIGHTS
+    )
+    # Days in the years up to last_day
+    last_day = datetime.datetime.strptime(args.last_day, "%Y-%m-%d").date()
+    first_day = last_day - datetime.timedelta(days=365 * args.years - 1)
+    day_ordinals = np.arange(first_day.toordinal(), last_day.toordinal() + 1)
+    day_weights = np.where(
+        [datetime.date.fromordinal(int(day)).weekday() < 5 for day in day_ordinals],
+        WEEKDAY_WEIGHT,
+        1,
+    ).astype(float)
+    contribution_days = random.choice(
+        len(day_ordinals), args.contributions, p=day_weights / day_weights.sum()
+    )
+    dates = np.array(
+        [datetime.date.fromordinal(int(day)).isoformat() for day in day_ordinals],
+        dtype=object,
+    )
+
+    last_contribution_set = {
+        "contributor_login": np.array(logins, dtype=object)[contribution_users].tolist(),
+        "contributor_name": np.array(names, dtype=object)[contribution_users].tolist(),
+        "repo_name": np.array(repo_names, dtype=object)[contribution_repos].tolist(),
+        "contribution_type": np.array(CONTRIBUTION_TYPES, dtype=object)[
+            contribution_types
+        ].tolist(),
+        "date": dates[contribution_days].tolist(),
+    }
+    return data_contributors, contributor_list, data_teams, last_contribution_set
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    data_contributors, contributor_list, data_teams, last_contribution_set = generate(
+        args
+    )
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, "contributors.json"), "w+") as f:
+        json.dump(data_contributors, f)
+    with open(os.path.join(args.output, "contributor_list.json"), "w+") as f:
+        json.dump(contributor_list, f)
+    with open(os.path.join(args.output, "teams.json"), "w+") as f:
+        json.dump(data_teams, f)
+    contribution_store.save_columnar(
+        last_contribution_set, os.path.join(args.output, "contributions")
+    )
+    if not args.no_json:
+        with open(os.path.join(args.output, "contributions.json"), "w+") as f:
+            json.dump(last_contribution_set, f)
+    # The settings the organization was made with, saved with the benchmark results
+    with open(os.path.join(args.output, "generator.json"), "w+") as f:
+        json.dump(vars(args), f)
+    print(
+        "Generated {} users, {} repositories, {} teams and {} contributions in {}".format(
+            args.users, args.repos, args.teams, args.contributions, args.output
+        )
+    )
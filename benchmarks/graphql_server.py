@@ -0,0 +1,546 @@
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import base64
+import random
+import argparse
+import datetime
+import threading
+import collections
+import socketserver
+import http.server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import contribution_store
+
+# =====================================
+# Stand-in GitHub GraphQL server
+# =====================================
+
+"""
+Answers the queries in query_strings.py from the data files of an organization,
+usually one made by generate_org.py, so gatherData.py can be run and timed
+without GitHub. Point gatherData.py at it with API_URL
+
+Like GitHub, pages are followed with cursors, connections have a totalCount,
+contributionsCollection only covers a year at most, and every query costs
+rate limit points that are reported in rateLimit and the X-RateLimit-* headers.
+Latency, 502 errors and secondary rate limits can be added to any fraction of
+the requests, and the rate limit budget can be made small enough to run out
+"""
+
+parser = argparse.ArgumentParser(description="Serve an organization like GitHub's GraphQL API")
+parser.add_argument(
+    "--data",
+    default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "org", "data"),
+    help="folder with the data files of the organization",
+)
+parser.add_argument("--organization", default="synthetic", help="login of the organization")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8000)
+parser.add_argument(
+    "--today",
+    default=None,
+    help="day contributionsCollection counts back from (default the last contribution)",
+)
+parser.add_argument("--latency", type=float, default=0, help="seconds added to every request")
+parser.add_argument(
+    "--latency-per-point",
+    type=float,
+    default=0,
+    help="seconds added to every request for each rate limit point it costs",
+)
+parser.add_argument(
+    "--error-rate", type=float, default=0, help="fraction of requests answered with a 502"
+)
+parser.add_argument(
+    "--secondary-rate",
+    type=float,
+    default=0,
+    help="fraction of requests answered with a secondary rate limit",
+)
+parser.add_argument(
+    "--retry-after", type=int, default=1, help="Retry-After seconds of a secondary rate limit"
+)
+parser.add_argument("--rate-limit", type=int, default=5000, help="points in each rate limit window")
+parser.add_argument(
+    "--rate-window", type=int, default=3600, help="seconds until the rate limit is reset"
+)
+parser.add_argument("--seed", type=int, default=0, help="seed of the injected failures")
+parser.add_argument("--verbose", action="store_true", help="log every request")
+
+CONTRIBUTION_TYPES = {
+    "Commit": "commitContributionsByRepository",
+    "Issue": "issueContributionsByRepository",
+    "PullRequest": "pullRequestContributionsByRepository",
+    "PullRequestReview": "pullRequestReviewContributionsByRepository",
+}
+
+# Query shapes, matched in order
+ORGANIZATION = re.compile(r'organization\(login:\s*"([^"]*)"\)')
+SINGLE_REPO = re.compile(
+    r'repository\(name:\s*"([^"]*)"\)\s*\{\s*collaborators\(first:\s*100,\s*after:\s*"([^"]*)"\)'
+)
+SINGLE_TEAM = re.compile(
+    r'team\(slug:\s*"([^"]*)"\)\s*\{\s*(members|repositories)\(first:\s*100,\s*after:\s*"([^"]*)"\)'
+)
+TEAMS = re.compile(r'teams\(first:\s*100(?:,\s*after:\s*"([^"]*)")?\)')
+REPOSITORIES = re.compile(r'repositories\(first:\s*100(?:,\s*after:\s*"([^"]*)")?\)')
+ORGANIZATION_ID = re.compile(r'organization\(login:\s*"[^"]*"\)\s*\{\s*id\s*\}')
+USER = re.compile(
+    r'(?:(u\d+):\s*)?user\(login:\s*"([^"]*)"\)\s*\{\s*contributionsCollection\(([^)]*)\)'
+)
+CONTRIBUTIONS_AFTER = re.compile(r'contributions\(first:\s*100,\s*after:\s*"([^"]*)"\)')
+ARGUMENT = re.compile(r'(\w+):\s*"([^"]*)"')
+CONNECTION = re.compile(r"(?:first|maxRepositories):\s*(\d+)|[{}]")
+
+
+# Cursors are opaque to clients, like GitHub's
+def encode_cursor(offset):
+    return base64.b64encode("cursor:{}".format(offset).encode()).decode()
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return 0
+    return int(base64.b64decode(cursor.encode()).decode().split(":")[1])
+
+
+# Gets one page of a connection of nodes, starting after cursor
+def connection(nodes, cursor="", first=100, total_count=True):
+    start = decode_cursor(cursor)
+    page = nodes[start : start + first]
+    result = {
+        "pageInfo": {
+            "endCursor": encode_cursor(start + len(page)) if page else None,
+            "hasNextPage": start + first < len(nodes),
+        },
+        "edges": [{"node": node} for node in page],
+    }
+    if total_count:
+        result["totalCount"] = len(nodes)
+    return result
+
+
+# Gets the rate limit cost of a query the way GitHub does: every connection
+# takes one request for each of its parents, and 100 requests cost one point
+def query_cost(query):
+    total_requests = 0
+    parent_nodes = [1]
+    connection_size = 1
+    for match in CONNECTION.finditer(query):
+        token = match.group(0)
+        if token == "{":
+            parent_nodes.append(parent_nodes[-1] * connection_size)
+            connection_size = 1
+        elif token == "}":
+            parent_nodes.pop()
+        else:
+            connection_size = int(match.group(1))
+            total_requests += parent_nodes[-1]
+    return max(total_requests // 100, 1)
+
+
+def graphql_error(message, error_type=None, path=None):
+    error = {"message": message}
+    if error_type is not None:
+        error["type"] = error_type
+    if path is not None:
+        error["path"] = path
+    return error
+
+
+class QueryError(Exception):
+    pass
+
+
+# The organization being served, indexed for every query shape
+class Organization:
+    def __init__(self, data_dir, login, today=None):
+        self.login = login
+        self.id = base64.b64encode("Organization:{}".format(login).encode()).decode()
+        with open(os.path.join(data_dir, "contributors.json"), "r") as f:
+            data_contributors = json.load(f)
+        with open(os.path.join(data_dir, "teams.json"), "r") as f:
+            data_teams = json.load(f)
+        self.repos = [
+            {"name": name, "collaborators": repo["collaborators"]}
+            for name, repo in data_contributors.items()
+        ]
+        self.repo_lookup = {repo["name"]: repo for repo in self.repos}
+        self.teams = [
+            {
+                "name": name,
+                "members": team["members"],
+                "repositories": team["repositories"],
+            }
+            for name, team in data_teams.items()
+        ]
+        self.team_lookup = {team["name"]: team for team in self.teams}
+
+        contribution_set = contribution_store.read_contribution_set(
+            os.path.join(data_dir, "contributions"),
+            os.path.join(data_dir, "contributions.json"),
+        )
+        # (date, type, repo) of each user's contributions, most recent first
+        self.contributions = collections.defaultdict(list)
+        for login, repo_name, contribution_type, date in zip(
+            contribution_set["contributor_login"],
+            contribution_set["repo_name"],
+            contribution_set["contribution_type"],
+            contribution_set["date"],
+        ):
+            self.contributions[login].append((date, contribution_type, repo_name))
+        for rows in self.contributions.values():
+            rows.sort(reverse=True)
+        self.users = {
+            user["login"]
+            for repo in self.repos
+            for user in repo["collaborators"]
+        } | set(self.contributions)
+
+        if today is None:
+            today = max(
+                (rows[0][0] for rows in self.contributions.values()),
+                default=datetime.date.today().isoformat(),
+            )
+        self.today = datetime.datetime.strptime(today, "%Y-%m-%d").date()
+
+    # Gets the data and errors of a query
+    def execute(self, query):
+        organization = ORGANIZATION.search(query)
+        if organization is not None:
+            if organization.group(1) != self.login:
+                return (
+                    {"organization": None},
+                    [
+                        graphql_error(
+                            "Could not resolve to an Organization with the login of '{}'.".format(
+                                organization.group(1)
+                            ),
+                            "NOT_FOUND",
+                            ["organization"],
+                        )
+                    ],
+                )
+            return {"organization": self.organization(query)}, []
+        users = USER.findall(query)
+        if users:
+            return self.user_contributions(query, users)
+        raise QueryError("This query isn't one of the queries in query_strings.py")
+
+    def organization(self, query):
+        single_repo = SINGLE_REPO.search(query)
+        if single_repo is not None:
+            repo_name, cursor = single_repo.groups()
+            repo = self.repo_lookup.get(repo_name)
+            if repo is None:
+                return {"repository": None}
+            collaborators = connection(repo["collaborators"], cursor, total_count=False)
+            return {"repository": {"collaborators": collaborators}}
+        single_team = SINGLE_TEAM.search(query)
+        if single_team is not None:
+            slug, field, cursor = single_team.groups()
+            team = self.team_lookup.get(slug)
+            if team is None:
+                return {"team": None}
+            return {"team": {field: connection(team[field], cursor, total_count=False)}}
+        teams = TEAMS.search(query)
+        if teams is not None:
+            page = connection(self.teams, teams.group(1) or "", total_count=False)
+            for edge in page["edges"]:
+                team = edge["node"]
+                edge["node"] = {
+                    "name": team["name"],
+                    "members": connection(team["members"]),
+                    "repositories": connection(team["repositories"]),
+                }
+            return {"teams": page}
+        repositories = REPOSITORIES.search(query)
+        if repositories is not None:
+            page = connection(self.repos, repositories.group(1) or "", total_count=False)
+            for edge in page["edges"]:
+                repo = edge["node"]
+                edge["node"] = {
+                    "name": repo["name"],
+                    "collaborators": connection(repo["collaborators"]),
+                }
+            return {"repositories": page}
+        if ORGANIZATION_ID.search(query) is not None:
+            return {"id": self.id}
+        raise QueryError("This query isn't one of the queries in query_strings.py")
+
+    # Gets the time range of a contributionsCollection
+    # to defaults to today, or a year after from, and from to a year before to
+    def time_range(self, arguments):
+        year = datetime.timedelta(days=365)
+        start = end = None
+        if "from" in arguments:
+            start = datetime.datetime.strptime(arguments["from"][0:10], "%Y-%m-%d").date()
+        if "to" in arguments:
+            end = datetime.datetime.strptime(arguments["to"][0:10], "%Y-%m-%d").date()
+        if end is None:
+            end = self.today if start is None else min(self.today, start + year)
+        if start is None:
+            start = end - year
+        if end - start > year:
+            raise QueryError(
+                "The total time spanned by 'from' and 'to' must not exceed 1 year"
+            )
+        return start.isoformat(), end.isoformat()
+
+    def user_contributions(self, query, users):
+        # Types of contributions selected, and the cursor of their next page
+        fields = [field for field in CONTRIBUTION_TYPES.values() if field in query]
+        after = CONTRIBUTIONS_AFTER.search(query)
+        cursor = after.group(1) if after is not None else ""
+        data = {}
+        errors = []
+        for alias, login, argument_text in users:
+            alias = alias or "user"
+            if login not in self.users:
+                data[alias] = None
+                errors.append(
+                    graphql_error(
+                        "Could not resolve to a User with the login of '{}'.".format(
+                            login
+                        ),
+                        "NOT_FOUND",
+                        [alias],
+                    )
+                )
+                continue
+            arguments = dict(ARGUMENT.findall(argument_text))
+            try:
+                start, end = self.time_range(arguments)
+            except QueryError as e:
+                data[alias] = None
+                errors.append(graphql_error(str(e), path=[alias, "contributionsCollection"]))
+                continue
+            rows = [row for row in self.contributions[login] if start <= row[0] <= end]
+            data[alias] = {
+                "contributionsCollection": self.contributions_collection(
+                    rows, fields, cursor
+                )
+            }
+        return data, errors
+
+    def contributions_collection(self, rows, fields, cursor):
+        by_type = {
+            contribution_type: collections.OrderedDict()
+            for contribution_type in CONTRIBUTION_TYPES
+        }
+        for date, contribution_type, repo_name in rows:
+            by_type[contribution_type].setdefault(repo_name, []).append(
+                {"occurredAt": "{}T00:00:00Z".format(date)}
+            )
+        collection = {
+            "hasAnyContributions": bool(rows),
+            "contributionCalendar": {"totalContributions": len(rows)},
+        }
+        for contribution_type, field in CONTRIBUTION_TYPES.items():
+            if field not in fields:
+                continue
+            # Repositories with the most contributions first
+            repos = sorted(
+                by_type[contribution_type].items(), key=lambda item: -len(item[1])
+            )[:100]
+            collection[field] = [
+                {
+                    "repository": {"name": repo_name},
+                    "contributions": connection(nodes, cursor),
+                }
+                for repo_name, nodes in repos
+            ]
+        return collection
+
+
+# Rate limit points left in the current window
+class Budget:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.reset_at = int(time.time()) + window
+        self.remaining = limit
+
+    # Spends cost points, and returns whether there were enough left, the points
+    # left and when they reset
+    def spend(self, cost):
+        with self.lock:
+            now = time.time()
+            if now >= self.reset_at:
+                self.reset_at = int(now) + self.window
+                self.remaining = self.limit
+            if self.remaining < cost:
+                return False, self.remaining, self.reset_at
+            self.remaining -= cost
+            return True, self.remaining, self.reset_at
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    # Keep connections alive like GitHub, so gatherData.py reuses them
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, body, headers=None):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            content = gzip.compress(content)
+            self.send_header("Content-Encoding", "gzip")
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.server.lock:
+                self.send_json(200, dict(self.server.stats))
+        else:
+            self.send_json(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            server.count("unauthorized")
+            self.send_json(401, {"message": "Bad credentials"})
+            return
+        try:
+            query = json.loads(body.decode())["query"]
+        except (ValueError, KeyError):
+            server.count("bad requests")
+            self.send_json(400, {"message": "Problems parsing JSON"})
+            return
+
+        cost = query_cost(query)
+        time.sleep(server.latency + server.latency_per_point * cost)
+        failure = server.failure()
+        if failure == "502":
+            server.count("502s")
+            self.send_json(
+                502,
+                {
+                    "data": None,
+                    "errors": [
+                        graphql_error(
+                            "Something went wrong while executing your query. This may be the result of a timeout, or it could be a GitHub bug."
+                        )
+                    ],
+                },
+            )
+            return
+        if failure == "secondary":
+            server.count("secondary rate limits")
+            self.send_json(
+                403,
+                {"message": "You have exceeded a secondary rate limit."},
+                {"Retry-After": server.retry_after},
+            )
+            return
+
+        allowed, remaining, reset_at = server.budget.spend(cost)
+        rate_headers = {
+            "X-RateLimit-Limit": server.budget.limit,
+            "X-RateLimit-Remaining": remaining,
+            "X-RateLimit-Reset": reset_at,
+        }
+        if not allowed:
+            server.count("rate limited")
+            self.send_json(
+                200,
+                {
+                    "data": None,
+                    "errors": [
+                        graphql_error(
+                            "API rate limit exceeded for user.", "RATE_LIMITED"
+                        )
+                    ],
+                },
+                dict(rate_headers, **{"X-RateLimit-Remaining": 0}),
+            )
+            return
+
+        try:
+            data, errors = server.organization.execute(query)
+        except QueryError as e:
+            server.count("unsupported queries")
+            self.send_json(200, {"errors": [graphql_error(str(e))]}, rate_headers)
+            return
+        if "rateLimit" in query:
+            data["rateLimit"] = {
+                "cost": cost,
+                "remaining": remaining,
+                "resetAt": datetime.datetime.utcfromtimestamp(reset_at).strftime(
+                    "%Y-%m-%dT%H:%M:%SZ"
+                ),
+            }
+        result = {"data": data}
+        if errors:
+            result["errors"] = errors
+        server.count("queries")
+        self.send_json(200, result, rate_headers)
+
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, organization, args):
+        super().__init__(address, Handler)
+        self.organization = organization
+        self.verbose = args.verbose
+        self.latency = args.latency
+        self.latency_per_point = args.latency_per_point
+        self.error_rate = args.error_rate
+        self.secondary_rate = args.secondary_rate
+        self.retry_after = args.retry_after
+        self.budget = Budget(args.rate_limit, args.rate_window)
+        self.random = random.Random(args.seed)
+        self.lock = threading.Lock()
+        # Requests by how they were answered
+        self.stats = collections.Counter()
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    # Picks whether a request fails, and how
+    def failure(self):
+        with self.lock:
+            draw = self.random.random()
+        if draw < self.error_rate:
+            return "502"
+        if draw < self.error_rate + self.secondary_rate:
+            return "secondary"
+        return None
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    organization = Organization(args.data, args.organization, args.today)
+    server = Server((args.host, args.port), organization, args)
+    print(
+        "Serving {} ({} repositories, {} teams, contributions up to {}) at http://{}:{}/graphql".format(
+            args.organization,
+            len(organization.repos),
+            len(organization.teams),
+            organization.today,
+            args.host,
+            server.server_address[1],
+        )
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(dict(server.stats)))
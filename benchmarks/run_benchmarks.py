@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import datetime
+import statistics
+import subprocess
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+# =====================================
+# Benchmarks
+# =====================================
+
+"""
+Times app.py startup and its callbacks on the data in <workdir>/data, usually a
+synthetic organization made by generate_org.py
+
+Startup is timed in new processes, both without a snapshot of the prepared data
+(cold) and with one (warm). Callbacks are called through Dash, so serializing
+the result is included, with the result cache turned off. Results are saved as
+JSON, and compared with an earlier result file with --compare
+"""
+
+parser = argparse.ArgumentParser(description="Benchmark app.py")
+parser.add_argument(
+    "--workdir",
+    default=os.path.join(BENCHMARKS_DIR, "org"),
+    help="folder with the data folder to benchmark",
+)
+parser.add_argument("--repeat", type=int, default=5, help="timed runs of each benchmark")
+parser.add_argument(
+    "--startup-repeat", type=int, default=3, help="timed runs of each kind of startup"
+)
+parser.add_argument(
+    "--output",
+    default=None,
+    help="file to save the results to (default benchmarks/results/<time>.json)",
+)
+parser.add_argument("--compare", default=None, help="earlier results to compare with")
+parser.add_argument(
+    "--threshold",
+    type=float,
+    default=1.2,
+    help="slowdown of the median over the earlier results that counts as a regression",
+)
+
+# Settings for the app under benchmark: no reloading and no cached results
+APP_ENVIRONMENT = {"RELOAD_INTERVAL": "0", "CACHE_ENTRIES": "0", "CACHE_DIR": ""}
+
+STARTUP_SCRIPT = """
+import sys, time
+sys.path.insert(0, {!r})
+start = time.perf_counter()
+import app
+print(time.perf_counter() - start)
+"""
+
+
+# Gets the min, median, mean and max of a list of seconds
+def summarize(seconds):
+    return {
+        "min": min(seconds),
+        "median": statistics.median(seconds),
+        "mean": statistics.mean(seconds),
+        "max": max(seconds),
+        "runs": len(seconds),
+    }
+
+
+# Times importing app.py in a new process
+def time_startup(workdir, cold):
+    if cold:
+        shutil.rmtree(os.path.join(workdir, "data", ".cache"), ignore_errors=True)
+    environment = dict(os.environ, **APP_ENVIRONMENT)
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT.format(REPO_DIR)],
+        cwd=workdir,
+        env=environment,
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def benchmark_startup(workdir, repeat):
+    results = {}
+    for kind, cold in [("cold", True), ("warm", False)]:
+        # A warm start needs the snapshot of a first start
+        if not cold:
+            time_startup(workdir, False)
+        seconds = [time_startup(workdir, cold) for _ in range(repeat)]
+        results["startup ({})".format(kind)] = summarize(seconds)
+    return results
+
+
+# Times one callback with one set of inputs, after an untimed run
+def time_callback(callback, args, repeat):
+    response = callback(*args)
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        callback(*args)
+        seconds.append(time.perf_counter() - start)
+    result = summarize(seconds)
+    result["payload_bytes"] = len(response)
+    return result
+
+
+# Gets representative inputs for the callbacks from the data
+def benchmark_cases(data):
+    contributions_df = data["contributions_df"]
+    all_days = data["all_days_list"]
+    min_date, max_date = all_days[0], all_days[-1]
+    recent_date = all_days[max(len(all_days) - 90, 0)]
+    last_week_date = all_days[max(len(all_days) - 7, 0)]
+    top_repo = contributions_df.repo_name.value_counts().index[0]
+    top_team = max(
+        data["membership"].teams,
+        key=lambda team: len(data["membership"].team_members(team)),
+    )
+    weekends = ["include_weekends"]
+    all_contrib = [
+        ("everything", (min_date, max_date, weekends, "All", "All", "All")),
+        ("weekdays", (min_date, max_date, None, "All", "All", "All")),
+        ("last 90 days", (recent_date, max_date, weekends, "All", "All", "All")),
+        ("commits", (min_date, max_date, weekends, "Commit", "All", "All")),
+        ("top repo", (min_date, max_date, weekends, "All", top_repo, "All")),
+        ("top team", (min_date, max_date, weekends, "All", "All", top_team)),
+        (
+            "commits in top repo and team",
+            (min_date, max_date, None, "Commit", top_repo, top_team),
+        ),
+    ]
+    everything = all_contrib[0][1]
+    # Over a short period, so there are people who didn't contribute
+    last_week = (last_week_date, max_date, weekends, "All", "All", "All")
+    last_page = (len(contributions_df) - 1) // 10
+    all_table = [
+        ("contributions", everything + ("contributions", 0, 10, [], "")),
+        ("no contributions", last_week + ("no_contributions", 0, 10, [], "")),
+        (
+            "sorted by date",
+            everything
+            + ("contributions", 0, 10, [{"column_id": "date", "direction": "desc"}], ""),
+        ),
+        (
+            "filtered to top repo",
+            everything
+            + ("contributions", 0, 10, [], '{{repo_name}} eq "{}"'.format(top_repo)),
+        ),
+        ("last page", everything + ("contributions", last_page, 10, [], "")),
+    ]
+    user_counts = contributions_df.contributor_login.value_counts()
+    users = [
+        ("most active user", user_counts.index[0]),
+        ("median user", user_counts.index[len(user_counts.index) // 2]),
+        ("least active user", user_counts.index[-1]),
+    ]
+    return all_contrib, all_table, users
+
+
+def benchmark_callbacks(workdir, repeat):
+    os.environ.update(APP_ENVIRONMENT)
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    import app
+
+    all_contrib, all_table, users = benchmark_cases(app.live_data.current)
+    results = {}
+    for name, args in all_contrib:
+        results["update_all_contrib ({})".format(name)] = time_callback(
+            app.update_all_contrib, args, repeat
+        )
+    for name, args in all_table:
+        results["update_all_table ({})".format(name)] = time_callback(
+            app.update_all_table, args, repeat
+        )
+    for name, user in users:
+        results["update_calendar_start ({})".format(name)] = time_callback(
+            app.update_calendar_start, (user,), repeat
+        )
+        results["create_user_repo_list ({})".format(name)] = time_callback(
+            app.create_user_repo_list, (user,), repeat
+        )
+        results["update_user_contrib ({})".format(name)] = time_callback(
+            app.update_user_contrib, (user,), repeat
+        )
+    return results
+
+
+# Prints how the medians changed since the earlier results, and returns the
+# names of the benchmarks that got slower than threshold
+def compare(results, earlier_results, threshold):
+    regressions = []
+    print("{:<55} {:>12} {:>12}".format("", "before", "after"))
+    for name, result in results["benchmarks"].items():
+        earlier = earlier_results["benchmarks"].get(name)
+        if earlier is None:
+            print("{:<55} new".format(name))
+            continue
+        ratio = result["median"] / earlier["median"] if earlier["median"] else 0
+        regressed = ratio > threshold
+        if regressed:
+            regressions.append(name)
+        print(
+            "{:<55} {:>10.2f}ms {:>10.2f}ms {:>6.2f}x{}".format(
+                name,
+                earlier["median"] * 1000,
+                result["median"] * 1000,
+                ratio,
+                " REGRESSION" if regressed else "",
+            )
+        )
+    return regressions
+
+
+# Gets the commit being benchmarked, if the repository is a git repository
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_DIR,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            universal_newlines=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    workdir = os.path.abspath(args.workdir)
+    generator_path = os.path.join(workdir, "data", "generator.json")
+    generator = None
+    if os.path.exists(generator_path):
+        with open(generator_path, "r") as f:
+            generator = json.load(f)
+
+    benchmarks = benchmark_startup(workdir, args.startup_repeat)
+    benchmarks.update(benchmark_callbacks(workdir, args.repeat))
+    results = {
+        "time": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "generator": generator,
+        "benchmarks": benchmarks,
+    }
+    for name, result in benchmarks.items():
+        print("{:<55} {:>10.2f}ms".format(name, result["median"] * 1000))
+
+    output = args.output or os.path.join(
+        BENCHMARKS_DIR, "results", "{}.json".format(results["time"].replace(":", "-"))
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w+") as f:
+        json.dump(results, f, indent=2)
+    print("Saved results in {}".format(output))
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            earlier_results = json.load(f)
+        regressions = compare(results, earlier_results, args.threshold)
+        if regressions:
+            print("{} benchmarks regressed".format(len(regressions)))
+            sys.exit(1)
@@ -0,0 +1,41 @@
+import numpy as np
+
+# Periods the days of a graph can be grouped into, from the finest
+PERIODS = ("day", "week", "month")
+
+
+# Gets the week and month of each day in a range, as numbers that increase with
+# the date, so that consecutive days with the same number are in the same bin
+def period_keys(datetime_days):
+    day_numbers = np.arange(len(datetime_days), dtype=np.int32)
+    return {
+        "day": day_numbers,
+        # Weeks start on Monday
+        "week": (day_numbers - np.asarray(datetime_days.dayofweek)).astype(np.int32),
+        "month": np.asarray(
+            datetime_days.year * 12 + datetime_days.month - 1, dtype=np.int32
+        ),
+    }
+
+
+# Sums daily counts into bins of days, weeks or months, using the finest period
+# that keeps the number of bins within max_points
+# day_offsets are the sorted positions of the days to graph, and day_counts the
+# counts of every day. Each bin is labelled with its first day in day_offsets
+# Returns the period, the offsets of the bin labels and the count of each bin
+def bin_counts(day_offsets, day_counts, keys, max_points):
+    day_offsets = np.asarray(day_offsets)
+    if len(day_offsets) == 0:
+        return PERIODS[0], day_offsets, day_counts[day_offsets]
+    for period in PERIODS:
+        period_offsets = keys[period][day_offsets]
+        starts = np.flatnonzero(
+            np.concatenate(([True], period_offsets[1:] != period_offsets[:-1]))
+        )
+        if len(starts) <= max_points:
+            break
+    return (
+        period,
+        day_offsets[starts],
+        np.add.reduceat(day_counts[day_offsets], starts),
+    )
@@ -0,0 +1,189 @@
+import json
+import time
+import bisect
+import hashlib
+import threading
+import functools
+import contextlib
+import collections
+
+import flask
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Upper bounds of the payload histogram buckets, in bytes
+PAYLOAD_BUCKETS = (1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20)
+# Most distinct values counted for each input
+MAX_DISTINCT = 10000
+
+
+# Counts of observed values in buckets, in the Prometheus histogram format
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # The last count is for values over the last bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Gets the lines of the histogram in the Prometheus text format
+    def lines(self, name, labels):
+        label_text = ",".join('{}="{}"'.format(key, value) for key, value in labels)
+        lines = []
+        cumulative = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(
+                '{}_bucket{{{},le="{}"}} {}'.format(name, label_text, bucket, cumulative)
+            )
+        lines.append(
+            '{}_bucket{{{},le="+Inf"}} {}'.format(name, label_text, self.count)
+        )
+        lines.append("{}_sum{{{}}} {}".format(name, label_text, self.sum))
+        lines.append("{}_count{{{}}} {}".format(name, label_text, self.count))
+        return lines
+
+
+# Latency, payload size and input cardinality of every Dash callback
+# attach() times each callback request and measures its response. Callbacks
+# decorated with measure() also time their filter and aggregate phases with
+# phase(), and the rest of the request is the time Dash takes to serialize the
+# result. With slow_seconds, callbacks slower than that are logged to
+# slow_log_path as JSON lines with their inputs
+class CallbackMetrics:
+    def __init__(self, slow_seconds=None, slow_log_path=None):
+        self.slow_seconds = slow_seconds
+        self.slow_log_path = slow_log_path
+        self.lock = threading.Lock()
+        # Histograms by callback and phase, "total" is the whole request
+        self.latency = collections.defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.payload = collections.defaultdict(lambda: Histogram(PAYLOAD_BUCKETS))
+        # Hashes of the distinct values of each input, by callback and input
+        self.distinct = collections.defaultdict(set)
+
+    # Times the callback requests of a Dash app
+    def attach(self, app):
+        server = app.server
+
+        @server.before_request
+        def start_timer():
+            flask.g.callback_start = time.perf_counter()
+            flask.g.callback_phases = collections.defaultdict(float)
+
+        @server.after_request
+        def record(response):
+            if flask.request.path.endswith("/_dash-update-component"):
+                self.record_request(app, response)
+            return response
+
+    # Decorator that times a callback's function, so that the time Dash takes
+    # to serialize its result is the rest of the request
+    def measure(self, func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            if not flask.has_request_context():
+                return func(*args)
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                flask.g.callback_function_seconds = time.perf_counter() - start
+
+        return wrapper
+
+    # Times one phase of the callback being run
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if flask.has_request_context() and "callback_phases" in flask.g:
+                flask.g.callback_phases[name] += time.perf_counter() - start
+
+    def record_request(self, app, response):
+        body = flask.request.get_json(silent=True) or {}
+        output = body.get("output")
+        if output not in app.callback_map:
+            return
+        name = app.callback_map[output]["callback"].__name__
+        total_seconds = time.perf_counter() - flask.g.callback_start
+        phases = dict(flask.g.callback_phases)
+        if "callback_function_seconds" in flask.g:
+            phases["serialize"] = max(
+                total_seconds - flask.g.callback_function_seconds, 0
+            )
+        payload_bytes = response.calculate_content_length() or 0
+        inputs = {
+            "{}.{}".format(item["id"], item["property"]): item.get("value")
+            for item in body.get("inputs", []) + body.get("state", [])
+        }
+
+        with self.lock:
+            self.latency[(name, "total")].observe(total_seconds)
+            for phase_name, seconds in phases.items():
+                self.latency[(name, phase_name)].observe(seconds)
+            self.payload[name].observe(payload_bytes)
+            for input_name, value in inputs.items():
+                values = self.distinct[(name, input_name)]
+                if len(values) < MAX_DISTINCT:
+                    values.add(
+                        hashlib.sha1(
+                            json.dumps(value, sort_keys=True, default=str).encode()
+                        ).hexdigest()
+                    )
+
+        if self.slow_seconds is not None and total_seconds >= self.slow_seconds:
+            self.log_slow(name, total_seconds, phases, payload_bytes, inputs)
+
+    # Appends a slow callback to the slow log
+    def log_slow(self, name, total_seconds, phases, payload_bytes, inputs):
+        line = json.dumps(
+            {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "callback": name,
+                "seconds": total_seconds,
+                "phases": phases,
+                "payload_bytes": payload_bytes,
+                "inputs": inputs,
+            },
+            default=str,
+        )
+        with self.lock:
+            with open(self.slow_log_path, "a") as f:
+                f.write(line + "\n")
+
+    # Gets every metric in the Prometheus text format
+    def prometheus_text(self):
+        lines = [
+            "# HELP dash_callback_seconds Wall time of Dash callbacks by phase",
+            "# TYPE dash_callback_seconds histogram",
+        ]
+        with self.lock:
+            for (name, phase_name), histogram in sorted(self.latency.items()):
+                lines += histogram.lines(
+                    "dash_callback_seconds", [("callback", name), ("phase", phase_name)]
+                )
+            lines += [
+                "# HELP dash_callback_payload_bytes Size of Dash callback responses",
+                "# TYPE dash_callback_payload_bytes histogram",
+            ]
+            for name, histogram in sorted(self.payload.items()):
+                lines += histogram.lines(
+                    "dash_callback_payload_bytes", [("callback", name)]
+                )
+            lines += [
+                "# HELP dash_callback_input_cardinality Distinct values of each input",
+                "# TYPE dash_callback_input_cardinality gauge",
+            ]
+            for (name, input_name), values in sorted(self.distinct.items()):
+                lines.append(
+                    'dash_callback_input_cardinality{{callback="{}",input="{}"}} {}'
+                    .format(name, input_name, len(values))
+                )
+        return "\n".join(lines) + "\n"
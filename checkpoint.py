@@ -0,0 +1,118 @@
+import os
+import json
+import shutil
+import threading
+
+
+# Saves the progress of a gatherData.py run so that a crashed run can be resumed
+# Pages of main_query and finished contributors are appended to files in
+# `directory` as soon as they are gathered. A line cut off by a crash is cut
+# from the file when it is read back, before anything is appended to it, and
+# the work it held is done again
+class Checkpoint:
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        # Files whose cut off lines have been removed
+        self.repaired = set()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    # Whether there is saved progress to resume from
+    def exists(self):
+        return os.path.exists(self.path("run.json"))
+
+    # Deletes all saved progress
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    # Gets the settings of the run that is being resumed
+    def load_run(self):
+        with open(self.path("run.json"), "r") as f:
+            return json.load(f)
+
+    # Saves the settings of a new run, a resumed run must reuse them to get the
+    # same output
+    def save_run(self, run):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path("run.json"), "w+") as f:
+            json.dump(run, f)
+
+    def append_line(self, name, entry):
+        if name not in self.repaired:
+            self.read_lines(name)
+        with self.lock:
+            with open(self.path(name), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+
+    # Reads the complete lines of a file, and truncates it after the last one so
+    # the next line isn't appended onto a line cut off by a crash
+    def read_lines(self, name):
+        entries = []
+        with self.lock:
+            self.repaired.add(name)
+            if not os.path.exists(self.path(name)):
+                return entries
+            # Byte offset of the end of the last complete line
+            end = 0
+            with open(self.path(name), "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        entries.append(json.loads(line.decode()))
+                    except ValueError:
+                        break
+                    end += len(line)
+                cut_off = f.seek(0, os.SEEK_END) > end
+            if cut_off:
+                with open(self.path(name), "r+b") as f:
+                    f.truncate(end)
+        return entries
+
+    # Gets the pages of a main_query that were already gathered
+    # as a list of {"end_cursor": ..., "has_next_page": ..., "edges": [...]}
+    def load_pages(self, query_name):
+        return self.read_lines("{}.pages.jsonl".format(query_name))
+
+    def save_page(self, query_name, end_cursor, has_next_page, edges):
+        self.append_line(
+            "{}.pages.jsonl".format(query_name),
+            {"end_cursor": end_cursor, "has_next_page": has_next_page, "edges": edges},
+        )
+
+    # Gets the finished result of a main_query, or None if it didn't finish
+    def load_result(self, query_name):
+        path = self.path("{}.json".format(query_name))
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def save_result(self, query_name, final_data):
+        path = self.path("{}.json".format(query_name))
+        # Write to a temporary file first so a crash can't leave half a result
+        with open(path + ".tmp", "w+") as f:
+            json.dump(final_data, f)
+        os.replace(path + ".tmp", path)
+
+    # Gets the contribution sets of the contributors that were already queried
+    # as a dictionary of login to contribution set
+    def load_contributions(self):
+        return {
+            entry["login"]: entry["contributions"]
+            for entry in self.read_lines("contributions.jsonl")
+        }
+
+    # Contributors that couldn't be queried (None) aren't saved, so a resumed run
+    # queries them again
+    def save_contributions(self, contributors, contribution_sets):
+        for contributor, contribution_set in zip(contributors, contribution_sets):
+            if contribution_set is None:
+                continue
+            self.append_line(
+                "contributions.jsonl",
+                {"login": contributor["login"], "contributions": contribution_set},
+            )
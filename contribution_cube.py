@@ -0,0 +1,78 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+# Dimensions of the cube, besides the day
+DIMENSIONS = ("contribution_type", "repo_name", "team")
+
+
+# Daily contribution counts grouped by some of the cube's dimensions
+# The rows are sorted by group, so each group owns one slice of the day and
+# count arrays
+class Rollup:
+    def __init__(self, grouped, dimensions):
+        frame = grouped.reset_index()
+        self.days = frame.day.values.astype(np.int32)
+        self.counts = frame["count"].values.astype(np.int64)
+        self.slices = {}
+        if not dimensions:
+            self.slices[()] = (0, len(frame.index))
+            return
+        for key, positions in frame.groupby(list(dimensions), sort=False).indices.items():
+            if not isinstance(key, tuple):
+                key = (key,)
+            self.slices[key] = (positions[0], positions[-1] + 1)
+
+    def day_counts(self, key, day_count):
+        start, end = self.slices.get(key, (0, 0))
+        return np.bincount(
+            self.days[start:end], weights=self.counts[start:end], minlength=day_count
+        ).astype(np.int64)
+
+
+# Number of contributions per day by contribution type, repository and team
+# Every combination of dimensions (with the rest rolled up into "All") is
+# aggregated once when the data is loaded, so any choice of dropdowns is a
+# dictionary lookup and a bincount over one slice of a rollup. A contribution is
+# counted once for every team its contributor is on, and once for "All" teams
+class ContributionCube:
+    def __init__(self, contributions_df, data_teams, min_date, day_count):
+        self.day_count = day_count
+        days = (contributions_df.datetime_date - min_date).dt.days
+        contributions = pd.DataFrame(
+            {
+                "contribution_type": contributions_df.contribution_type.values,
+                "repo_name": contributions_df.repo_name.values,
+                "contributor_login": contributions_df.contributor_login.values,
+                "day": days.values,
+            }
+        )
+        group_columns = ["contribution_type", "repo_name", "contributor_login", "day"]
+        base = contributions.groupby(group_columns).size().rename("count").reset_index()
+        team_members = pd.DataFrame(
+            [
+                {"team": team_name, "contributor_login": member["login"]}
+                for team_name, team_content in data_teams.items()
+                for member in team_content["members"]
+            ],
+            columns=["team", "contributor_login"],
+        ).drop_duplicates()
+        team_base = base.merge(team_members, on="contributor_login")
+
+        self.rollups = {}
+        for dimension_count in range(len(DIMENSIONS) + 1):
+            for dimensions in itertools.combinations(DIMENSIONS, dimension_count):
+                source = team_base if "team" in dimensions else base
+                grouped = source.groupby(list(dimensions) + ["day"])["count"].sum()
+                self.rollups[dimensions] = Rollup(grouped, dimensions)
+
+    # Gets the number of contributions on each day since min_date
+    # Each argument is a single value or "All"
+    def counts(self, contribution_type="All", repo="All", team="All"):
+        values = {"contribution_type": contribution_type, "repo_name": repo, "team": team}
+        dimensions = tuple(
+            dimension for dimension in DIMENSIONS if values[dimension] != "All"
+        )
+        key = tuple(values[dimension] for dimension in dimensions)
+        return self.rollups[dimensions].day_counts(key, self.day_count)
@@ -0,0 +1,121 @@
+import os
+import json
+import shutil
+import datetime
+
+import numpy as np
+
+# =====================================
+# Columnar contributions format
+# =====================================
+
+"""
+A directory with one .npy file per column and a JSON file of dictionaries
+
+dictionaries.json{
+    "version": 1,
+    "logins": ['Username'],
+    "names": ['Name'],  (the name of each login)
+    "repos": ['Repo Name'],
+    "types": ['Commit']
+}
+login.npy - int32 index into logins for each contribution
+repo.npy - int32 index into repos for each contribution
+type.npy - int8 index into types for each contribution
+day.npy - int32 date ordinal (datetime.date.toordinal) of each contribution
+
+The .npy files are stored uncompressed so they can be memory mapped
+"""
+
+FORMAT_VERSION = 1
+
+
+# Converts a list of values to a dictionary of unique values and an index into
+# that dictionary for every value
+def encode(values):
+    index = {}
+    codes = [index.setdefault(value, len(index)) for value in values]
+    return list(index), codes
+
+
+# Saves a contribution set in the columnar format
+def save_columnar(contribution_set, directory):
+    logins, login_codes = encode(contribution_set["contributor_login"])
+    names = [None] * len(logins)
+    for login_code, name in zip(login_codes, contribution_set["contributor_name"]):
+        names[login_code] = name
+    repos, repo_codes = encode(contribution_set["repo_name"])
+    types, type_codes = encode(contribution_set["contribution_type"])
+    dates, date_codes = encode(contribution_set["date"])
+    date_days = np.array(
+        [datetime.datetime.strptime(date, "%Y-%m-%d").toordinal() for date in dates],
+        dtype=np.int32,
+    )
+    days = date_days[np.array(date_codes, dtype=np.int64)] if dates else date_days
+
+    # Write everything to a temporary directory first so that a crash can't
+    # leave a mix of old and new columns
+    temp_directory = directory + ".tmp"
+    shutil.rmtree(temp_directory, ignore_errors=True)
+    os.makedirs(temp_directory)
+    np.save(os.path.join(temp_directory, "login.npy"), np.array(login_codes, np.int32))
+    np.save(os.path.join(temp_directory, "repo.npy"), np.array(repo_codes, np.int32))
+    np.save(os.path.join(temp_directory, "type.npy"), np.array(type_codes, np.int8))
+    np.save(os.path.join(temp_directory, "day.npy"), days)
+    with open(os.path.join(temp_directory, "dictionaries.json"), "w+") as f:
+        json.dump(
+            {
+                "version": FORMAT_VERSION,
+                "logins": logins,
+                "names": names,
+                "repos": repos,
+                "types": types,
+            },
+            f,
+        )
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(temp_directory, directory)
+
+
+# Loads the columnar format
+# With mmap the column arrays are read only views of the files, so nothing is
+# read from disk until it is used
+def load_columnar(directory, mmap=True):
+    with open(os.path.join(directory, "dictionaries.json"), "r") as f:
+        columns = json.load(f)
+    for column in ["login", "repo", "type", "day"]:
+        columns[column] = np.load(
+            os.path.join(directory, column + ".npy"), mmap_mode="r" if mmap else None
+        )
+    return columns
+
+
+# Converts the columnar format to arrays of values, in the same layout as the
+# JSON contribution set
+def decode_columns(columns):
+    days, day_codes = np.unique(columns["day"], return_inverse=True)
+    dates = [datetime.date.fromordinal(int(day)).isoformat() for day in days]
+    return {
+        "contributor_login": np.array(columns["logins"], dtype=object)[columns["login"]],
+        "contributor_name": np.array(columns["names"], dtype=object)[columns["login"]],
+        "repo_name": np.array(columns["repos"], dtype=object)[columns["repo"]],
+        "contribution_type": np.array(columns["types"], dtype=object)[columns["type"]],
+        "date": np.array(dates, dtype=object)[day_codes],
+    }
+
+
+# Loads a contribution set from the columnar format if it exists, and from the
+# JSON export otherwise
+def read_contribution_set(directory, json_path):
+    if os.path.isdir(directory):
+        return {
+            key: list(values)
+            for key, values in decode_columns(load_columnar(directory)).items()
+        }
+    with open(json_path, "r") as f:
+        return json.load(f)
+
+
+# Whether there is a saved contribution set in either format
+def contribution_set_exists(directory, json_path):
+    return os.path.isdir(directory) or os.path.exists(json_path)
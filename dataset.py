@@ -0,0 +1,318 @@
+import os
+import json
+import glob
+import shutil
+import pickle
+import hashlib
+import threading
+import contextlib
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, processes prepare the data without waiting for
+    # each other
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+import binning
+import contribution_store
+from contribution_cube import ContributionCube
+from membership import Membership
+
+# Prepared data is saved here, named after the hash of the data it came from
+SNAPSHOT_DIR = ".cache"
+# Change whenever the prepared data changes shape, so old snapshots aren't used
+SNAPSHOT_VERSION = 9
+# Arrays at least this big are saved to their own .npy file in the snapshot and
+# memory mapped when it is loaded
+SHARED_MIN_BYTES = 4096
+# Columns of strings that repeat on many rows, stored as codes into categories
+CATEGORICAL_COLUMNS = [
+    "contributor_login",
+    "contributor_name",
+    "repo_name",
+    "contribution_type",
+    "date",
+]
+# gatherData.py writes this file after all the other data files of a run
+GENERATION_FILE = "generation.json"
+
+
+# Gets the files the prepared data is built from
+def source_paths(data_dir):
+    paths = [
+        os.path.join(data_dir, "contributors.json"),
+        os.path.join(data_dir, "contributor_list.json"),
+        os.path.join(data_dir, "teams.json"),
+    ]
+    columnar_dir = os.path.join(data_dir, "contributions")
+    if os.path.isdir(columnar_dir):
+        return paths + sorted(glob.glob(os.path.join(columnar_dir, "*")))
+    return paths + [os.path.join(data_dir, "contributions.json")]
+
+
+# Gets a hash of the contents of the source files
+def source_hash(data_dir):
+    sha = hashlib.sha1(str(SNAPSHOT_VERSION).encode())
+    for path in source_paths(data_dir):
+        sha.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+# Reads the contributions from the columnar format, or the JSON export if it is
+# the only data there is
+def read_contributions(data_dir):
+    columnar_dir = os.path.join(data_dir, "contributions")
+    if os.path.isdir(columnar_dir):
+        return contribution_store.decode_columns(
+            contribution_store.load_columnar(columnar_dir)
+        )
+    with open(os.path.join(data_dir, "contributions.json"), "r") as f:
+        return json.load(f)
+
+
+# Reads one of the JSON data files
+def read_json(data_dir, name):
+    with open(os.path.join(data_dir, name), "r") as f:
+        return json.load(f)
+
+
+# Builds the contributions DataFrame, the lists of days the graphs use, the
+# indexes the graphs are counted from, the membership index and the dropdown
+# options
+def prepare_data(data_dir):
+    data_contributors = read_json(data_dir, "contributors.json")
+    contributor_list = read_json(data_dir, "contributor_list.json")
+    data_teams = read_json(data_dir, "teams.json")
+    prepared = prepare_contributions(read_contributions(data_dir), data_teams)
+    prepared["contributor_list"] = contributor_list
+    prepared["membership"] = Membership(data_contributors, data_teams)
+    # Convert lists of repos, teams and contributors to options
+    prepared["repo_list_options"] = [{"label": "All", "value": "All"}] + [
+        {"label": repo, "value": repo} for repo in data_contributors.keys()
+    ]
+    prepared["team_list_options"] = [{"label": "All", "value": "All"}] + [
+        {"label": team, "value": team} for team in data_teams.keys()
+    ]
+    prepared["user_options"] = [
+        {
+            "label": contributor["name"] if contributor["name"] else contributor["login"],
+            "value": contributor["login"],
+        }
+        for contributor in contributor_list
+    ]
+    return prepared
+
+
+# Builds the contributions DataFrame, the lists of days the graphs use and the
+# indexes the graphs are counted from
+def prepare_contributions(data_contributions, data_teams):
+    # Construct pandas DataFrame
+    contributions_df = pd.DataFrame(data=data_contributions)
+    # Add datetime dates and is_weekday as pandas columns
+    contributions_df["datetime_date"] = pd.to_datetime(
+        contributions_df.date, format="%Y-%m-%d"
+    )
+    contributions_df["is_weekday"] = contributions_df.datetime_date.dt.dayofweek < 5
+
+    # Get dates for DatePickerRange
+    min_date = contributions_df.datetime_date.min()
+    max_date = contributions_df.datetime_date.max()
+    # Get a list of days in string format
+    datetime_days = pd.date_range(min_date, max_date, freq="D")
+    prepared = {
+        "contributions_df": contributions_df,
+        "min_date": min_date,
+        "max_date": max_date,
+        "all_days_list": list(datetime_days.strftime("%Y-%m-%d")),
+        "all_days_array": np.array(datetime_days.strftime("%Y-%m-%d"), dtype=object),
+        # Positions of the weekdays in all_days_list
+        "weekday_offsets": np.flatnonzero(datetime_days.dayofweek < 5),
+        # Week and month of each day in all_days_list, for binning the graphs
+        "period_keys": binning.period_keys(datetime_days),
+        "contribution_cube": ContributionCube(
+            contributions_df, data_teams, min_date, len(datetime_days)
+        ),
+    }
+    # Sorted ordered categories keep the sort order and comparisons of strings
+    for column in CATEGORICAL_COLUMNS:
+        contributions_df[column] = pd.Categorical(contributions_df[column], ordered=True)
+    return prepared
+
+
+# Pickles the prepared data, saving its arrays to .npy files in the snapshot
+# directory instead of in the pickle
+class SnapshotPickler(pickle.Pickler):
+    def __init__(self, f, snapshot_path):
+        super().__init__(f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.snapshot_path = snapshot_path
+        # Names of the arrays already saved, by id
+        self.saved = {}
+        # Keeps the saved arrays alive so that their ids aren't reused
+        self.arrays = []
+
+    def persistent_id(self, obj):
+        if (
+            type(obj) is not np.ndarray
+            or obj.dtype.hasobject
+            or obj.nbytes < SHARED_MIN_BYTES
+        ):
+            return None
+        if id(obj) not in self.saved:
+            name = "array-{}.npy".format(len(self.saved))
+            np.save(os.path.join(self.snapshot_path, name), obj)
+            self.saved[id(obj)] = name
+            self.arrays.append(obj)
+        return self.saved[id(obj)]
+
+
+# Unpickles the prepared data, memory mapping the arrays saved to .npy files
+# The arrays are read only views of the files, so every process that loads the
+# same snapshot shares one copy of them in memory
+class SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, f, snapshot_path):
+        super().__init__(f)
+        self.snapshot_path = snapshot_path
+        self.loaded = {}
+
+    def persistent_load(self, name):
+        if name not in self.loaded:
+            self.loaded[name] = np.asarray(
+                np.load(os.path.join(self.snapshot_path, name), mmap_mode="r")
+            )
+        return self.loaded[name]
+
+
+# Loads a snapshot, or returns None if it doesn't exist or can't be read
+def load_snapshot(snapshot_path):
+    try:
+        with open(os.path.join(snapshot_path, "prepared.pkl"), "rb") as f:
+            return SnapshotUnpickler(f, snapshot_path).load()
+    except Exception:
+        return None
+
+
+# Saves a snapshot, through a temporary directory so that other processes never
+# see part of one
+def save_snapshot(prepared, snapshot_path):
+    temp_path = "{}.{}.tmp".format(snapshot_path, os.getpid())
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    with open(os.path.join(temp_path, "prepared.pkl"), "wb") as f:
+        SnapshotPickler(f, temp_path).dump(prepared)
+    try:
+        os.rename(temp_path, snapshot_path)
+    except OSError:
+        # Another process saved the same snapshot first
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+
+# Lets one process at a time prepare the data
+@contextlib.contextmanager
+def prepare_lock(snapshot_dir):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(snapshot_dir, "prepare.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# Loads the prepared data, from a snapshot if the data hasn't changed since the
+# last time it was prepared
+# Every server process loads the same snapshot and shares its arrays. The first
+# one to find no snapshot prepares the data, and the others wait for it
+# Returns the prepared data and whether it came from a snapshot
+def load_prepared(data_dir):
+    snapshot_dir = os.path.join(data_dir, SNAPSHOT_DIR)
+    version = source_hash(data_dir)
+    snapshot_path = os.path.join(snapshot_dir, "prepared-{}".format(version))
+    prepared = load_snapshot(snapshot_path)
+    if prepared is not None:
+        return prepared, True
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with prepare_lock(snapshot_dir):
+        # Another process may have prepared it while this one waited
+        prepared = load_snapshot(snapshot_path)
+        if prepared is not None:
+            return prepared, True
+        prepared = prepare_data(data_dir)
+        # The hash of the source files identifies this version of the data
+        prepared["version"] = version
+
+        # Replace the snapshots of older data
+        # Processes still using them keep their mapped files until they reload
+        for old_snapshot in glob.glob(os.path.join(snapshot_dir, "prepared-*")):
+            if os.path.isdir(old_snapshot):
+                shutil.rmtree(old_snapshot, ignore_errors=True)
+            else:
+                try:
+                    os.remove(old_snapshot)
+                except OSError:
+                    pass
+        save_snapshot(prepared, snapshot_path)
+    # Use the mapped arrays of the snapshot instead of a private copy
+    mapped = load_snapshot(snapshot_path)
+    return (prepared if mapped is None else mapped), False
+
+
+# Gets the generation gatherData.py last finished writing, or None before the
+# first run that wrote one
+def read_generation(data_dir):
+    try:
+        with open(os.path.join(data_dir, GENERATION_FILE), "r") as f:
+            return json.load(f)["generation"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+# The prepared data being served, reloaded when gatherData.py finishes a run
+# A reload prepares the new data in a background thread and then replaces
+# current in a single assignment. Callbacks read current once and use only that
+# dictionary, so a callback that started before a reload finishes on the data
+# it started with
+class LiveData:
+    def __init__(self, data_dir, interval):
+        self.data_dir = data_dir
+        # Seconds between checks for a new generation, 0 never reloads
+        self.interval = interval
+        self.generation = read_generation(data_dir)
+        self.current, self.from_snapshot = load_prepared(data_dir)
+        if interval > 0:
+            threading.Thread(target=self.watch, daemon=True).start()
+
+    def watch(self):
+        while True:
+            time.sleep(self.interval)
+            generation = read_generation(self.data_dir)
+            if generation == self.generation:
+                continue
+            try:
+                self.reload(generation)
+            except Exception as e:
+                # Keep serving the old data and try again at the next check
+                print("Couldn't reload the data: {}".format(e))
+
+    def reload(self, generation):
+        reload_start = time.perf_counter()
+        prepared, _ = load_prepared(self.data_dir)
+        self.current = prepared
+        self.generation = generation
+        print(
+            "Reloaded {} contributions of generation {} in {:.2f}s".format(
+                len(prepared["contributions_df"].index),
+                generation,
+                time.perf_counter() - reload_start,
+            )
+        )
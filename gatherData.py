@@ -1,50 +1,226 @@
 import json
 import os
+import sys
+import argparse
+import datetime
 
 import queries
 import query_strings as qs
+import contribution_store
+from checkpoint import Checkpoint
 
-# Collaborators
-print("Querying Contributors")
-final_collab = queries.main_query(
-    qs.collaborators, "repositories", [qs.single_repo], "repository", ["collaborators"]
+parser = argparse.ArgumentParser(description="Gather GitHub organization data")
+parser.add_argument(
+    "--incremental",
+    action="store_true",
+    help="only query contributions made since the last run and merge them into the saved contributions",
 )
-final_collab_dict = queries.to_dict(final_collab, ["collaborators"])
-
-print("Querying Teams")
-final_team = queries.main_query(
-    qs.teams,
-    "teams",
-    [qs.single_team_members, qs.single_team_repos],
-    "team",
-    ["members", "repositories"],
+parser.add_argument(
+    "--json",
+    action="store_true",
+    help="also export the contributions to data/contributions.json",
 )
-final_team_dict = queries.to_dict(final_team, ["members", "repositories"])
+parser.add_argument(
+    "--fresh",
+    action="store_true",
+    help="discard the progress saved by an unfinished run instead of resuming it",
+)
+parser.add_argument(
+    "--since",
+    default=None,
+    help="gather contributions made since this day (YYYY-MM-DD) instead of the last year",
+)
+parser.add_argument(
+    "--quiet",
+    action="store_true",
+    help="only print how long each phase took, instead of every page and contributor",
+)
+args = parser.parse_args()
+telemetry = queries.telemetry
+telemetry.quiet = args.quiet
+
+# Resume an unfinished run with the same settings, or start a new one
+checkpoint = Checkpoint("data/checkpoint")
+if args.fresh:
+    checkpoint.clear()
+run = checkpoint.load_run() if checkpoint.exists() else None
+if (
+    run is not None
+    and run["incremental"] == args.incremental
+    and run.get("since") == args.since
+):
+    telemetry.progress("Resuming the run started at {}".format(run["run_started"]))
+else:
+    run = {
+        "incremental": args.incremental,
+        "since": args.since,
+        "run_started": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    checkpoint.clear()
+    checkpoint.save_run(run)
+run_started = datetime.datetime.strptime(run["run_started"], "%Y-%m-%dT%H:%M:%SZ")
+
+# Teams
+with telemetry.phase("teams"):
+    final_team = queries.main_query(
+        qs.teams,
+        "teams",
+        [qs.single_team_members, qs.single_team_repos],
+        "team",
+        ["members", "repositories"],
+        checkpoint=checkpoint,
+    )
+    final_team_dict = queries.to_dict(final_team, ["members", "repositories"])
 
+with telemetry.phase("organization id"):
+    organization_id = queries.get_organization_id(qs.organization_id)
 
-# Last Contribution
-print("Gathering Contributors")
-contributor_list = queries.get_contributors(final_collab_dict)
-organization_id = queries.get_organization_id(qs.organization_id)
-print("Querying Last Contributions")
-last_contribution_set = queries.contributor_last_contribution(
-    qs.last_contribution, contributor_list, organization_id
+# Contributions are gathered for the last year, or since --since
+if args.since:
+    since = datetime.datetime.strptime(args.since, "%Y-%m-%d")
+else:
+    since = run_started - datetime.timedelta(days=queries.YEAR_DAYS - 1)
+
+# Incremental runs only query each contributor since their last query
+incremental = args.incremental and contribution_store.contribution_set_exists(
+    "data/contributions", "data/contributions.json"
 )
+high_water_marks = {}
+if incremental and os.path.exists("data/high_water_marks.json"):
+    with open("data/high_water_marks.json", "r") as f:
+        high_water_marks = json.load(f)
+windows = queries.incremental_windows(high_water_marks, since)
+
+# Collaborators and Last Contributions
+# Contributions are queried as soon as a page of repositories brings in new
+# collaborators, while the rest of the repositories are still being gathered
+final_collab = []
+seen_logins = set()
+
+
+def stream_contributors():
+    for edges in queries.stream_query(
+        qs.collaborators,
+        "repositories",
+        [qs.single_repo],
+        "repository",
+        ["collaborators"],
+        checkpoint=checkpoint,
+    ):
+        final_collab.extend(edges)
+        yield from queries.new_contributors(edges, seen_logins)
+
+
+with telemetry.phase("contributors and contributions"):
+    contribution_sets = queries.gather_contributions(
+        qs.user_contributions,
+        stream_contributors(),
+        organization_id,
+        windows=windows,
+        checkpoint=checkpoint,
+        end=run_started,
+    )
+    final_collab_dict = queries.to_dict(final_collab, ["collaborators"])
+    contributor_list = queries.get_contributors(final_collab_dict)
+    last_contribution_set = queries.ordered_contributions(
+        contribution_sets, contributor_list
+    )
+
+# Contributors whose queries kept failing
+failed_logins = [
+    contributor["login"]
+    for contributor in contributor_list
+    if contributor["login"] not in contribution_sets
+]
+if failed_logins:
+    print(
+        "Couldn't query the contributions of {}. They are queried again by the next --incremental run".format(
+            ", ".join(failed_logins)
+        )
+    )
+
+if incremental:
+    with telemetry.phase("merge"):
+        old_contribution_set = contribution_store.read_contribution_set(
+            "data/contributions", "data/contributions.json"
+        )
+        last_contribution_set = queries.merge_incremental(
+            old_contribution_set,
+            last_contribution_set,
+            contributor_list,
+            windows,
+            set(failed_logins),
+        )
+
+# The contributions of every contributor that was queried are now complete up to
+# the start of this run. The failed ones keep their last high water mark, if
+# they had one
+high_water_marks = {
+    contributor["login"]: run["run_started"]
+    if contributor["login"] in contribution_sets
+    else high_water_marks[contributor["login"]]
+    for contributor in contributor_list
+    if contributor["login"] in contribution_sets
+    or contributor["login"] in high_water_marks
+}
 
 # Save data in data folder
-try:
-    os.mkdir("./data/")
-except:
-    pass
-with open("data/contributors.json", "w+") as f:
-    json.dump(final_collab_dict, f)
-print("Saved Contributors in data/contributors.json")
-with open("data/contributor_list.json", "w+") as f:
-    json.dump(contributor_list, f)
-print("Saved Contributor list to data/contributor_list.json")
-with open("data/teams.json", "w+") as f:
-    json.dump(final_team_dict, f)
-print("Saved Teams in data/teams.json")
-with open("data/contributions.json", "w+") as f:
-    json.dump(last_contribution_set, f)
-print("Saved Last Contributions in data/contributions.json")
+with telemetry.phase("save"):
+    try:
+        os.mkdir("./data/")
+    except:
+        pass
+    with open("data/contributors.json", "w+") as f:
+        json.dump(final_collab_dict, f)
+    telemetry.progress("Saved Contributors in data/contributors.json")
+    with open("data/contributor_list.json", "w+") as f:
+        json.dump(contributor_list, f)
+    telemetry.progress("Saved Contributor list to data/contributor_list.json")
+    with open("data/teams.json", "w+") as f:
+        json.dump(final_team_dict, f)
+    telemetry.progress("Saved Teams in data/teams.json")
+    contribution_store.save_columnar(last_contribution_set, "data/contributions")
+    telemetry.progress("Saved Last Contributions in data/contributions/")
+    if args.json:
+        with open("data/contributions.json", "w+") as f:
+            json.dump(last_contribution_set, f)
+        telemetry.progress("Saved Last Contributions in data/contributions.json")
+    with open("data/high_water_marks.json", "w+") as f:
+        json.dump(high_water_marks, f)
+    telemetry.progress("Saved High Water Marks in data/high_water_marks.json")
+    # Written last, so a running app.py only reloads once every file is saved
+    with open("data/generation.json.tmp", "w+") as f:
+        json.dump({"generation": run["run_started"]}, f)
+    os.replace("data/generation.json.tmp", "data/generation.json")
+    telemetry.progress(
+        "Saved Generation {} in data/generation.json".format(run["run_started"])
+    )
+
+# The run finished, so there is nothing left to resume
+checkpoint.clear()
+queries.print_connection_stats()
+
+# Performance of the run, to compare with earlier runs
+telemetry.save_report(
+    "data/run_report.json",
+    "data/run_reports.jsonl",
+    incremental=args.incremental,
+    run_started=run["run_started"],
+    teams=len(final_team_dict),
+    repositories=len(final_collab_dict),
+    contributors=len(contributor_list),
+    contributions=len(last_contribution_set["date"]),
+    rate_limit_waited=queries.rate_limiter.waited,
+    failed_contributors=failed_logins,
+    connections=queries.transport.stats(),
+)
+print("Saved Run Report in data/run_report.json")
+
+# The run didn't get everything, so it shouldn't look like it succeeded
+if failed_logins:
+    print(
+        "FAILED: {} of {} contributors couldn't be queried and are missing from the data: {}".format(
+            len(failed_logins), len(contributor_list), ", ".join(failed_logins)
+        )
+    )
+    sys.exit(1)
@@ -0,0 +1,90 @@
+import numpy as np
+
+
+# Pairs of codes grouped by their first code
+# The second codes of group i are values[offsets[i]:offsets[i + 1]], in the
+# order the pairs were added, so a whole index is two arrays of integers
+class Groups:
+    def __init__(self, firsts, seconds, group_count):
+        firsts = np.array(firsts, dtype=np.int64)
+        order = np.argsort(firsts, kind="mergesort")
+        self.values = np.array(seconds, dtype=np.int32)[order]
+        self.offsets = np.zeros(group_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(firsts, minlength=group_count), out=self.offsets[1:])
+
+    def get(self, code):
+        return self.values[self.offsets[code] : self.offsets[code + 1]]
+
+
+# Who is a collaborator on which repositories and a member of which teams,
+# indexed in both directions
+# Logins, repositories and teams are numbered, and the links between them are
+# kept in arrays of those numbers so they can be memory mapped and shared by
+# every server process
+class Membership:
+    def __init__(self, data_contributors, data_teams):
+        # Repositories and teams are kept in the order of the data files
+        self.repos = list(data_contributors.keys())
+        self.teams = list(data_teams.keys())
+        self.repo_lookup = {repo_name: code for code, repo_name in enumerate(self.repos)}
+        self.team_lookup = {team_name: code for code, team_name in enumerate(self.teams)}
+        self.logins = []
+        self.login_lookup = {}
+
+        repo_codes, repo_login_codes = self.links(
+            [repo_content["collaborators"] for repo_content in data_contributors.values()]
+        )
+        team_codes, team_login_codes = self.links(
+            [team_content["members"] for team_content in data_teams.values()]
+        )
+        login_count = len(self.logins)
+        self.repo_logins = Groups(repo_codes, repo_login_codes, len(self.repos))
+        self.login_repos = Groups(repo_login_codes, repo_codes, login_count)
+        self.team_logins = Groups(team_codes, team_login_codes, len(self.teams))
+        self.login_teams = Groups(team_login_codes, team_codes, login_count)
+
+    # Gets the (owner, login) code pairs of lists of users, numbering new logins
+    def links(self, user_lists):
+        owner_codes = []
+        login_codes = []
+        for owner_code, users in enumerate(user_lists):
+            for login in {user["login"] for user in users}:
+                owner_codes.append(owner_code)
+                login_codes.append(self.login_lookup.setdefault(login, len(self.logins)))
+                if len(self.login_lookup) > len(self.logins):
+                    self.logins.append(login)
+        return owner_codes, login_codes
+
+    # Gets the repositories a user is a collaborator on
+    def repos_of(self, login):
+        if login not in self.login_lookup:
+            return []
+        return [
+            self.repos[code] for code in self.login_repos.get(self.login_lookup[login])
+        ]
+
+    # Gets the teams a user is a member of
+    def teams_of(self, login):
+        if login not in self.login_lookup:
+            return []
+        return [
+            self.teams[code] for code in self.login_teams.get(self.login_lookup[login])
+        ]
+
+    # Gets the logins of a repository's collaborators
+    def repo_members(self, repo_name):
+        if repo_name not in self.repo_lookup:
+            return set()
+        return {
+            self.logins[code]
+            for code in self.repo_logins.get(self.repo_lookup[repo_name])
+        }
+
+    # Gets the logins of a team's members
+    def team_members(self, team_name):
+        if team_name not in self.team_lookup:
+            return set()
+        return {
+            self.logins[code]
+            for code in self.team_logins.get(self.team_lookup[team_name])
+        }
@@ -1,14 +1,54 @@
 import os
-import requests
+import re
+import time
+import datetime
 import collections
+import concurrent.futures
 
+import requests
 from dotenv import load_dotenv
 
+import retry
+import query_strings as qs
+from ratelimit import RateLimiter
+from transport import Transport
+from telemetry import RunTelemetry
+
 load_dotenv()
 
 # Get environment variables
 API_KEY = os.getenv("API_KEY")
 ORGANIZATION = os.getenv("ORGANIZATION")
+# GraphQL endpoint, e.g. benchmarks/graphql_server.py instead of GitHub
+API_URL = os.getenv("API_URL", "https://api.github.com/graphql")
+# Number of contributor queries that are run at the same time
+WORKERS = int(os.getenv("WORKERS", 8))
+# Number of repositories or teams whose extra pages are queried at the same time
+EXTRAS_WORKERS = int(os.getenv("EXTRAS_WORKERS", WORKERS))
+# Number of contributors put into a single query
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 10))
+# Number of ranges of days of contributors' contributions that are queried at
+# the same time, on top of WORKERS
+RANGE_WORKERS = int(os.getenv("RANGE_WORKERS", WORKERS))
+# Times a failed query is sent again, and retries allowed for every query sent
+MAX_RETRIES = int(os.getenv("MAX_RETRIES", 5))
+RETRY_BUDGET = float(os.getenv("RETRY_BUDGET", 0.2))
+# Times the contributors whose queries keep failing are queried again after
+# everyone else
+MAX_REQUEUES = int(os.getenv("MAX_REQUEUES", 3))
+
+# Seconds to wait to connect to GitHub, and then for GitHub to respond
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", 10))
+READ_TIMEOUT = float(os.getenv("READ_TIMEOUT", 60))
+
+# Selection added to every query to read the rate limit budget
+RATE_LIMIT = "rateLimit { cost remaining resetAt }"
+
+# GitHub rejects any query that could return more than this many nodes
+NODE_LIMIT = 500000
+
+# Most days of contributions GitHub gives in one contributionsCollection
+YEAR_DAYS = 365
 
 # Raise exception if environment variable doesn't exist
 for env_var in [API_KEY, ORGANIZATION]:
@@ -21,23 +61,141 @@ for env_var in [API_KEY, ORGANIZATION]:
 
 print("Querying information for {}".format(ORGANIZATION))
 
-# Run a GraphQL query
-def run_query(query, run_num=0):
-    # Set up Authorization
-    headers = {"Authorization": "Bearer " + API_KEY}
+# Shared connection pool, one connection per worker thread
+# Contributions are queried while repository extras are still being gathered, so
+# every set of workers can be busy at once
+transport = Transport(
+    API_URL,
+    {"Authorization": "Bearer " + API_KEY},
+    max(WORKERS + EXTRAS_WORKERS + RANGE_WORKERS, 1),
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+)
 
-    # Send Query Request
-    request = requests.post(
-        "https://api.github.com/graphql", json={"query": query}, headers=headers
-    )
-    if request.status_code == 200:
-        return request.json()
-    else:
-        raise Exception(
-            "Query failed to run by returning code of {}. Make sure that your API KEY is correct, in your .env, and has read:org, read:user, and repo permissions.".format(
-                request.status_code
+# Shared rate limit budget for every query
+rate_limiter = RateLimiter()
+
+# Shared backoff and retry budget for every query
+# The budget fills back up over the longest backoff when nothing is being sent
+RETRY_BUDGET_SIZE = 10 * max(MAX_RETRIES, 1)
+retry_policy = retry.RetryPolicy(
+    MAX_RETRIES, RETRY_BUDGET, RETRY_BUDGET_SIZE, RETRY_BUDGET_SIZE / retry.MAX_DELAY
+)
+
+# Latency, cost, size and retries of every query, and the time of each phase
+telemetry = RunTelemetry()
+
+
+# Run a GraphQL query
+# query_name is what the query gets, e.g. "repositories", for the run report
+# Queries that fail in a way that can pass are sent again with backoff (see
+# RetryPolicy). Raises QueryFailed if the query fails for good, or keeps failing
+def run_query(query, query_name="query"):
+    retry_policy.deposit()
+    # Number of times the query was sent again, and retried after a failure
+    resent = 0
+    retries = 0
+    while True:
+        # Wait for rate limit budget
+        rate_limiter.wait()
+        # Send Query Request
+        start = time.perf_counter()
+        try:
+            request = transport.post(query)
+        except requests.RequestException as e:
+            rate_limiter.refund()
+            telemetry.record_query(
+                query_name, time.perf_counter() - start, 0, 0, min(resent, 1), True
             )
+            retries = backoff(retry.classify_exception(e), str(e), retries)
+            resent += 1
+            continue
+        seconds = time.perf_counter() - start
+        rate_limiter.update_headers(request.headers)
+        if request.status_code != 200:
+            # Rate limits hold back every query until they have passed
+            rate_limiter.limited(request)
+            kind = retry.classify_response(request)
+            telemetry.record_query(
+                query_name,
+                seconds,
+                0,
+                len(request.content),
+                min(resent, 1),
+                kind != retry.RATE_LIMIT,
+            )
+            if kind == retry.RATE_LIMIT:
+                telemetry.progress("Rate limited, waiting to query again")
+            else:
+                rate_limiter.refund()
+                retries = backoff(kind, failure_message(request, kind), retries)
+            resent += 1
+            continue
+        try:
+            result = request.json()
+        except ValueError:
+            rate_limiter.refund()
+            telemetry.record_query(
+                query_name, seconds, 0, len(request.content), min(resent, 1), True
+            )
+            retries = backoff(retry.TRANSIENT, "Query returned invalid JSON", retries)
+            resent += 1
+            continue
+        rate_limiter.update_result(result)
+        rate_limit = (result.get("data") or {}).get("rateLimit") or {}
+        telemetry.record_query(
+            query_name,
+            seconds,
+            rate_limit.get("cost", 0),
+            len(request.content),
+            min(resent, 1),
+        )
+        if rate_limiter.limited_result(result):
+            telemetry.progress("Rate limited, waiting to query again")
+        elif retry.retriable_errors(result):
+            retries = backoff(
+                retry.GRAPHQL,
+                "Query returned errors: {}".format(result["errors"][0].get("message")),
+                retries,
+            )
+        else:
+            return result
+        resent += 1
+
+
+# Gets the message of a failed response
+def failure_message(request, kind):
+    if kind == retry.HARD:
+        return "Query failed to run by returning code of {}. Make sure that your API KEY is correct, in your .env, and has read:org, read:user, and repo permissions.".format(
+            request.status_code
         )
+    return "Query failed with {} ({})".format(kind, request.status_code)
+
+
+# Waits before a failed query is sent again, and returns how many times it has
+# been retried, or raises QueryFailed if it shouldn't be sent again
+def backoff(kind, message, retries):
+    if kind == retry.HARD:
+        raise retry.QueryFailed(message, kind)
+    if retries >= retry_policy.max_retries:
+        raise retry.QueryFailed("{}, gave up after {} retries".format(message, retries), kind)
+    if not retry_policy.withdraw():
+        raise retry.QueryFailed("{}, out of retry budget".format(message), kind)
+    telemetry.count("retries ({})".format(kind))
+    delay = retry_policy.delay(retries)
+    telemetry.progress("{}, trying again in {:.1f}s".format(message, delay))
+    time.sleep(delay)
+    return retries + 1
+
+
+# Prints how many requests reused an open connection
+def print_connection_stats():
+    stats = transport.stats()
+    print(
+        "Sent {} requests over {} connections ({} reused)".format(
+            stats["requests"], stats["connections"], stats["reused"]
+        )
+    )
 
 
 # Main query to get information
@@ -49,20 +207,115 @@ query_str_extras is a list for secondary queries that get the rest of the inform
 query_type1 is a GitHub API keyword to select certain info ("repository" or "team")
 query_type2 is a list of secondary GitHub API keywords to further select info
   - it is paired with query_str_extras to gather further data
+checkpoint optionally saves each page as it is gathered, so a later run can resume
+  from the last saved page
 """
 
 
 def main_query(
-    query_str_main, query_type_main, query_str_extras, query_type1, query_type2
+    query_str_main,
+    query_type_main,
+    query_str_extras,
+    query_type1,
+    query_type2,
+    checkpoint=None,
 ):
     final_data = []
+    for edges in stream_query(
+        query_str_main,
+        query_type_main,
+        query_str_extras,
+        query_type1,
+        query_type2,
+        checkpoint,
+    ):
+        final_data.extend(edges)
+    return final_data
+
+
+# Streaming version of main_query
+# Yields the edges one page at a time, as soon as the extras of every entity on
+# the page have been gathered, so the pages can be used while later pages are
+# still being queried. Pages are yielded in order
+def stream_query(
+    query_str_main,
+    query_type_main,
+    query_str_extras,
+    query_type1,
+    query_type2,
+    checkpoint=None,
+):
+    # Reuse the result of an earlier run
+    if checkpoint is not None:
+        saved_data = checkpoint.load_result(query_type_main)
+        if saved_data is not None:
+            telemetry.progress(
+                "Loaded {} entries from checkpoint".format(len(saved_data))
+            )
+            yield saved_data
+            return
+    final_data = []
+    # Pages whose extras are still being gathered
+    pending = collections.deque()
+    # Gather remaining information
+    # Each entity's pages are followed in order, but up to EXTRAS_WORKERS
+    # entities are paged through at the same time
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(EXTRAS_WORKERS, 1)
+    ) as executor:
+        for edges in paginate(query_str_main, query_type_main, checkpoint):
+            futures = [
+                executor.submit(
+                    get_extra_pages, this_query_str, query_type1, this_query_type, item
+                )
+                for this_query_str, this_query_type, item in find_extras(
+                    edges, query_str_extras, query_type2
+                )
+            ]
+            pending.append((edges, futures))
+            # Hand over the pages that are complete without waiting
+            while pending and all(future.done() for future in pending[0][1]):
+                edges = finish_page(pending.popleft())
+                final_data.extend(edges)
+                yield edges
+        while pending:
+            edges = finish_page(pending.popleft())
+            final_data.extend(edges)
+            yield edges
+    if checkpoint is not None:
+        checkpoint.save_result(query_type_main, final_data)
+
+
+# Waits for the extras of a page and returns its edges
+def finish_page(page):
+    edges, futures = page
+    for future in futures:
+        future.result()
+    return edges
+
+
+# Yields the edges of query_str_main one page (up to 100 entries) at a time
+# Stops after the page where pageInfo.hasNextPage is false
+def paginate(query_str_main, query_type_main, checkpoint=None):
     start_cursor = ""
+    has_next_page = True
     total_entries = 0
-    # Continue querying information while each query returns the max(100) entries
-    while (total_entries % 100) == 0:
+    # Resume from the pages gathered by an earlier run
+    if checkpoint is not None:
+        for page in checkpoint.load_pages(query_type_main):
+            has_next_page = page["has_next_page"]
+            if has_next_page:
+                start_cursor = ', after:"' + page["end_cursor"] + '"'
+            total_entries += len(page["edges"])
+            yield page["edges"]
+        if total_entries:
+            telemetry.progress(
+                "Resumed after {} entries from checkpoint".format(total_entries)
+            )
+    while has_next_page:
         # Sort through query_type
         query = query_str_main.format(ORGANIZATION, start_cursor)
-        result = run_query(query)
+        result = run_query(query, query_name=query_type_main)
         # Test to make sure data was actually received
         try:
             data_list = result["data"]["organization"][query_type_main]
@@ -70,46 +323,61 @@ def main_query(
             raise Exception(
                 "API Key does not have full permission. You must give complete read access."
             )
-        # Add queried data to final_data list
-        final_data.extend(data_list["edges"])
         # Move pagination cursor
-        end_cursor = data_list["pageInfo"]["endCursor"]
-        start_cursor = ', after:"' + end_cursor + '"'
+        page_info = data_list["pageInfo"]
+        has_next_page = page_info["hasNextPage"]
+        if has_next_page:
+            start_cursor = ', after:"' + page_info["endCursor"] + '"'
+        if checkpoint is not None:
+            checkpoint.save_page(
+                query_type_main,
+                page_info["endCursor"],
+                has_next_page,
+                data_list["edges"],
+            )
         # Print information to screen
-        total_entries = len(final_data)
-        print("Gathered {} entries".format(total_entries))
-    # Gather remaining information
+        total_entries += len(data_list["edges"])
+        telemetry.progress("Gathered {} entries".format(total_entries))
+        yield data_list["edges"]
+
+
+# Finds the entities on a page that have more than 100 children, and the query
+# that gets the rest of them
+def find_extras(edges, query_str_extras, query_type2):
+    extras = []
     for i, this_query_str in enumerate(query_str_extras):
         # Get query type from query_type2 list
         this_query_type = query_type2[i]
         # Sort through queried data to see if extras are needed
-        for entry in final_data:
+        for entry in edges:
             item = entry["node"]
             values = item[this_query_type]
             # If values is None, all of the values have been queried and nothing else needs to be fetched
             if values is None:
                 continue
-            child_count = values["totalCount"]
             # Original query gets 100 entries, so if greater than 100, need to get more
-            if child_count > 100:
-                item_name = item["name"]
-                # Set pagination cursor to the last one queried
-                end_cursor = values["pageInfo"]["endCursor"]
-                # Gather rest of the info
-                for i in range(100, child_count, 100):
-                    # Format query string
-                    new_query = this_query_str.format(
-                        ORGANIZATION, item_name, end_cursor
-                    )
-                    result = run_query(new_query)
-                    # Add new info to the existing list
-                    new_entry = result["data"]["organization"][query_type1][
-                        this_query_type
-                    ]
-                    item[this_query_type]["edges"].extend(new_entry["edges"])
-                    # Update pagination cursor
-                    end_cursor = new_entry["pageInfo"]["endCursor"]
-    return final_data
+            if values["totalCount"] > 100:
+                extras.append((this_query_str, this_query_type, item))
+    return extras
+
+
+# Gathers the rest of an entity's children, 100 at a time after the first 100
+def get_extra_pages(this_query_str, query_type1, this_query_type, item):
+    item_name = item["name"]
+    values = item[this_query_type]
+    child_count = values["totalCount"]
+    # Set pagination cursor to the last one queried
+    end_cursor = values["pageInfo"]["endCursor"]
+    # Gather rest of the info
+    for i in range(100, child_count, 100):
+        # Format query string
+        new_query = this_query_str.format(ORGANIZATION, item_name, end_cursor)
+        result = run_query(new_query, query_name=this_query_type)
+        # Add new info to the existing list
+        new_entry = result["data"]["organization"][query_type1][this_query_type]
+        values["edges"].extend(new_entry["edges"])
+        # Update pagination cursor
+        end_cursor = new_entry["pageInfo"]["endCursor"]
 
 
 # Converts the data into a more easily read/parsed python dictionary
@@ -140,7 +408,7 @@ def get_contributors(data_dict):
     for name, item in data_dict.items():
         contributor_list.extend(item["collaborators"])
     contributor_list = list({v["login"]: v for v in contributor_list}.values())
-    print("Gathered {} Contributors".format(len(contributor_list)))
+    telemetry.progress("Gathered {} Contributors".format(len(contributor_list)))
     contributor_list = sorted(
         contributor_list,
         key=lambda d: d["name"].lower() if d["name"] else d["login"].lower(),
@@ -148,11 +416,25 @@ def get_contributors(data_dict):
     return contributor_list
 
 
+# Yields the collaborators on a page of repositories that aren't in seen_logins
+# yet, so their contributions can be queried while more pages are gathered
+def new_contributors(edges, seen_logins):
+    for entry in edges:
+        collaborators = entry["node"]["collaborators"]
+        if collaborators is None:
+            continue
+        for edge in collaborators["edges"]:
+            contributor = edge["node"]
+            if contributor["login"] not in seen_logins:
+                seen_logins.add(contributor["login"])
+                yield contributor
+
+
 # Gets the organization id
 def get_organization_id(query_str):
-    result = run_query(query_str.format(ORGANIZATION))
+    result = run_query(query_str.format(ORGANIZATION), query_name="organization_id")
     organization_id = result["data"]["organization"]["id"]
-    print("Got organization_id {}".format(organization_id))
+    telemetry.progress("Got organization_id {}".format(organization_id))
     return organization_id
 
 
@@ -170,7 +452,9 @@ def get_contribution_type(
         contributions = repo["contributions"]
         all_contributions_list = contributions["edges"]
         total_count = contributions["totalCount"]
-        print("  {} - Found {} {}s".format(repo_name, total_count, contribution_name))
+        telemetry.progress(
+            "  {} - Found {} {}s".format(repo_name, total_count, contribution_name)
+        )
 
         for contribution in all_contributions_list:
             last_contribution_set["contributor_login"].append(contributor_login)
@@ -183,57 +467,510 @@ def get_contribution_type(
     return last_contribution_set
 
 
-# Gets all the last contributions by type and repository
-# types: commits, issues, PR's, PRR's
-def contributor_last_contribution(query_str, contributor_list, organization_id):
-    last_contribution_set = {
+contribution_types = [
+    "commitContributionsByRepository",
+    "issueContributionsByRepository",
+    "pullRequestContributionsByRepository",
+    "pullRequestReviewContributionsByRepository",
+]
+contribution_names = ["Commit", "Issue", "PullRequest", "PullRequestReview"]
+
+
+# Creates an empty set of contributions
+def new_contribution_set():
+    return {
         "contributor_login": [],
         "contributor_name": [],
         "repo_name": [],
         "contribution_type": [],
         "date": [],
     }
-    for contributor in contributor_list:
-        contributor_login = contributor["login"]
-        contributor_name = contributor["name"]
 
-        print(
-            "Querying contributions for {}".format(
-                contributor_name if contributor_name else contributor_login
+
+# Adds every row of contribution_set to the end of last_contribution_set
+def merge_contribution_set(last_contribution_set, contribution_set):
+    for key, values in contribution_set.items():
+        last_contribution_set[key].extend(values)
+    return last_contribution_set
+
+
+# Estimates how many nodes GitHub counts for a query
+# Every connection (first: N or maxRepositories: N) returns up to N nodes for
+# each of its parents, so the sizes multiply as the query gets deeper
+def estimate_nodes(query):
+    total_nodes = 0
+    parent_nodes = [1]
+    connection_size = 1
+    for match in re.finditer(r"(?:first|maxRepositories):\s*(\d+)|[{}]", query):
+        token = match.group(0)
+        if token == "{":
+            parent_nodes.append(parent_nodes[-1] * connection_size)
+            connection_size = 1
+        elif token == "}":
+            parent_nodes.pop()
+        else:
+            connection_size = int(match.group(1))
+            total_nodes += parent_nodes[-1] * connection_size
+    return total_nodes
+
+
+# Gets the first and last day of each year of contributions from start to end,
+# most recent first
+# GitHub only gives a year of contributions per contributionsCollection
+def year_ranges(start, end):
+    day_ranges = []
+    while end >= start:
+        range_start = max(start, end - datetime.timedelta(days=YEAR_DAYS - 1))
+        day_ranges.append((range_start, end))
+        end = range_start - datetime.timedelta(days=1)
+    return day_ranges
+
+
+# Splits a range of days into two halves, most recent first
+def split_range(day_range):
+    start, end = day_range
+    middle = start + (end - start) // 2
+    return [(middle + datetime.timedelta(days=1), end), (start, middle)]
+
+
+# Gets the time range argument for a contributionsCollection of a range of days
+def contribution_range(day_range):
+    return ', from: "{}T00:00:00Z", to: "{}T23:59:59Z"'.format(
+        day_range[0].isoformat(), day_range[1].isoformat()
+    )
+
+
+# Gets the largest number of users that fit in one query under NODE_LIMIT
+def max_batch_size(query_str, organization_id):
+    user_nodes = estimate_nodes(query_str.format(0, "", organization_id, ""))
+    return max(NODE_LIMIT // max(user_nodes, 1), 1)
+
+
+# Reads a contributor's contributionsCollection into a contribution set
+# Returns the contribution set, the (contribution type, repository, cursor) of
+# every repository with more contributions than the first page, and whether
+# there were more repositories than maxRepositories returns
+def read_collection(contributions, contributor):
+    contribution_set = new_contribution_set()
+    next_pages = []
+    repos_cut_off = False
+    for contribution_num, contribution_type in enumerate(contribution_types):
+        repos = contributions[contribution_type]
+        repos_cut_off = repos_cut_off or len(repos) >= 100
+        get_contribution_type(
+            repos,
+            contribution_names[contribution_num],
+            contributor["login"],
+            contributor["name"],
+            contribution_set,
+        )
+        for repo in repos:
+            page_info = repo["contributions"]["pageInfo"]
+            if page_info["hasNextPage"]:
+                next_pages.append(
+                    (contribution_num, repo["repository"]["name"], page_info["endCursor"])
+                )
+    return contribution_set, next_pages, repos_cut_off
+
+
+# Gets the contributions of a batch of contributors with a single query
+# Each contributor is selected under its own alias (u0, u1, ...), with the range
+# of days at the same position in day_ranges. If the query fails or returns
+# errors for any of them, the batch is split in half and each half is queried
+# again until the failing contributor is on its own
+# Gets the result of read_collection for each contributor, or None for a
+# contributor whose query keeps failing
+def batch_contributions(query_str, batch, organization_id, day_ranges):
+    telemetry.progress(
+        "Querying contributions for {}".format(
+            ", ".join(
+                contributor["name"] if contributor["name"] else contributor["login"]
+                for contributor in batch
             )
         )
+    )
 
-        # Run contributor query
-        contributor_query = query_str.format(contributor_login, organization_id)
-        result = run_query(contributor_query)
+    # Run batch query
+    user_queries = [
+        query_str.format(
+            user_num,
+            contributor["login"],
+            organization_id,
+            contribution_range(day_range),
+        )
+        for user_num, (contributor, day_range) in enumerate(zip(batch, day_ranges))
+    ]
+    batch_query = "{{\n{}\n{}\n}}".format(RATE_LIMIT, "\n".join(user_queries))
+    try:
+        result = run_query(batch_query, query_name="contributions")
+    except retry.QueryFailed as e:
+        if not e.retriable:
+            raise
+        if len(batch) == 1:
+            telemetry.progress(
+                "Couldn't query contributions for {}: {}".format(batch[0]["login"], e)
+            )
+            return [None]
+        result = {"errors": []}
+
+    if "errors" in result and len(batch) > 1:
+        telemetry.count("batch_splits")
+        half = len(batch) // 2
+        return batch_contributions(
+            query_str, batch[:half], organization_id, day_ranges[:half]
+        ) + batch_contributions(
+            query_str, batch[half:], organization_id, day_ranges[half:]
+        )
 
-        if "data" not in result:
+    data = result.get("data") or {}
+    errors = result.get("errors") or []
+    results = []
+    for user_num, contributor in enumerate(batch):
+        user = data.get("u{}".format(user_num))
+        # Users that don't exist have no contributions, any other user that is
+        # missing failed and is queried again later
+        if user is None and errors and not retry.permanent_errors(errors):
+            telemetry.progress(
+                "Couldn't query contributions for {}: {}".format(
+                    contributor["login"], errors[0].get("message")
+                )
+            )
+            results.append(None)
+            continue
+        if user is None:
+            results.append((new_contribution_set(), [], False))
             continue
-        contributions = result["data"]["user"]["contributionsCollection"]
-        contribution_count = contributions["contributionCalendar"]["totalContributions"]
-        contribution_types = [
-            "commitContributionsByRepository",
-            "issueContributionsByRepository",
-            "pullRequestContributionsByRepository",
-            "pullRequestReviewContributionsByRepository",
+        results.append(read_collection(user["contributionsCollection"], contributor))
+    return results
+
+
+# Follows the cursor of one repository's contributions of one type in a range of
+# days to the end, and returns the contributions after the first page
+# Every repository in the query gets the same cursor, only the one it came from
+# is read
+def contribution_pages(contributor, organization_id, day_range, next_page):
+    contribution_num, repo_name, cursor = next_page
+    contribution_set = new_contribution_set()
+    has_next_page = True
+    while has_next_page:
+        query = qs.user_contribution_pages.format(
+            contributor["login"],
+            organization_id,
+            contribution_range(day_range),
+            contribution_types[contribution_num],
+            cursor,
+        )
+        result = run_query(query, query_name="contribution pages")
+        user = (result.get("data") or {}).get("user")
+        if user is None:
+            errors = result.get("errors") or []
+            if not errors or retry.permanent_errors(errors):
+                break
+            raise retry.QueryFailed(
+                "Query returned errors: {}".format(errors[0].get("message")),
+                retry.GRAPHQL,
+            )
+        repos = user["contributionsCollection"][contribution_types[contribution_num]]
+        repo = next(
+            (repo for repo in repos if repo["repository"]["name"] == repo_name), None
+        )
+        if repo is None:
+            break
+        get_contribution_type(
+            [repo],
+            contribution_names[contribution_num],
+            contributor["login"],
+            contributor["name"],
+            contribution_set,
+        )
+        page_info = repo["contributions"]["pageInfo"]
+        has_next_page = page_info["hasNextPage"]
+        cursor = page_info["endCursor"]
+    return contribution_set
+
+
+# Gets the rest of a contributor's contributions, given the result of the batch
+# query of the most recent of their day_ranges
+# The other ranges are queried at the same time on range_executor. A range with
+# more contributions than one query returns is split in half, and the halves are
+# queried at the same time, until every range fits in a query or is a single
+# day. Single days with more than a page of contributions in a repository follow
+# the cursors of the repository. Returns None if any query keeps failing
+def complete_contributions(
+    query_str, contributor, organization_id, day_ranges, first_result, range_executor
+):
+    # Gets the result of read_collection for one range
+    def query_range(day_range):
+        return batch_contributions(query_str, [contributor], organization_id, [day_range])[
+            0
         ]
-        contribution_names = ["Commit", "Issue", "PullRequest", "PullRequestReview"]
-
-        last_contributions = {}
-        all_contributions = []
-        for contribution_num, contribution_type in enumerate(contribution_types):
-            this_contribution = contributions[contribution_type]
-            this_contribution_name = contribution_names[contribution_num]
-            last_contribution_set = get_contribution_type(
-                this_contribution,
-                this_contribution_name,
-                contributor_login,
-                contributor_name,
-                last_contribution_set,
+
+    # Results of the ranges that are done, by range
+    results = {}
+    checking = {day_ranges[0]: first_result}
+    checking.update(
+        {
+            day_range: range_executor.submit(query_range, day_range)
+            for day_range in day_ranges[1:]
+        }
+    )
+    while checking:
+        next_checking = {}
+        for day_range, result in checking.items():
+            if isinstance(result, concurrent.futures.Future):
+                result = result.result()
+            if result is None:
+                return None
+            contribution_set, next_pages, repos_cut_off = result
+            if (next_pages or repos_cut_off) and day_range[0] < day_range[1]:
+                telemetry.count("range_splits")
+                for half in split_range(day_range):
+                    next_checking[half] = range_executor.submit(query_range, half)
+                continue
+            if repos_cut_off:
+                telemetry.count("cut_off_days")
+            results[day_range] = (contribution_set, next_pages)
+        checking = next_checking
+
+    pages = [
+        (
+            day_range,
+            range_executor.submit(
+                contribution_pages, contributor, organization_id, day_range, next_page
+            ),
+        )
+        for day_range, (contribution_set, next_pages) in results.items()
+        for next_page in next_pages
+    ]
+    try:
+        for day_range, future in pages:
+            telemetry.count("contribution_pages")
+            merge_contribution_set(results[day_range][0], future.result())
+    except retry.QueryFailed as e:
+        if not e.retriable:
+            raise
+        telemetry.progress(
+            "Couldn't query contributions for {}: {}".format(contributor["login"], e)
+        )
+        return None
+
+    contribution_set = new_contribution_set()
+    for day_range in sorted(results, reverse=True):
+        merge_contribution_set(contribution_set, results[day_range][0])
+    return contribution_set
+
+
+# Gets all the last contributions by type and repository
+# types: commits, issues, PR's, PRR's
+# Contributors are queried batch_size at a time (as many as fit under
+# NODE_LIMIT), by up to `workers` threads at once. Their contributions are
+# merged in contributor_list order so the result is the same as querying them
+# one at a time
+def contributor_last_contribution(
+    query_str,
+    contributor_list,
+    organization_id,
+    workers=WORKERS,
+    batch_size=BATCH_SIZE,
+    windows=None,
+    checkpoint=None,
+    end=None,
+):
+    contribution_sets = gather_contributions(
+        query_str,
+        contributor_list,
+        organization_id,
+        workers,
+        batch_size,
+        windows,
+        checkpoint,
+        end,
+    )
+    return ordered_contributions(contribution_sets, contributor_list)
+
+
+# Queries the contributions of contributors as they come out of an iterable, and
+# returns a dictionary of login to contribution set
+# The iterable can be a generator that is still gathering contributors, a batch
+# is sent as soon as it is full
+# windows maps each contributor's login to the time their contributions are
+# queried from (see incremental_windows), they are queried up to the end time.
+# Without windows, the year up to end is queried. Every contributor's most
+# recent year is queried in the batch, and the rest of their contributions by
+# complete_contributions, on up to RANGE_WORKERS more threads
+# checkpoint optionally saves each contributor's contributions as soon as they
+# are queried, and contributors saved by an earlier run aren't queried again
+# Contributors whose queries keep failing are queried again after everyone else,
+# up to MAX_REQUEUES times, and left out if they still fail
+def gather_contributions(
+    query_str,
+    contributors,
+    organization_id,
+    workers=WORKERS,
+    batch_size=BATCH_SIZE,
+    windows=None,
+    checkpoint=None,
+    end=None,
+):
+    end_day = (end or datetime.datetime.utcnow()).date()
+    contribution_sets = {}
+    if checkpoint is not None:
+        contribution_sets = checkpoint.load_contributions()
+        if contribution_sets:
+            telemetry.progress(
+                "Loaded contributions for {} contributors from checkpoint".format(
+                    len(contribution_sets)
+                )
+            )
+
+    # Gets the ranges of days to query a contributor's contributions in
+    def contributor_ranges(contributor):
+        if windows is None:
+            return year_ranges(end_day - datetime.timedelta(days=YEAR_DAYS - 1), end_day)
+        start_day = datetime.datetime.strptime(
+            windows[contributor["login"]][0:10], "%Y-%m-%d"
+        ).date()
+        return year_ranges(min(start_day, end_day), end_day)
+
+    # Queries a batch and saves it to the checkpoint
+    def query_batch(batch):
+        batch_ranges = [contributor_ranges(contributor) for contributor in batch]
+        first_results = batch_contributions(
+            query_str,
+            batch,
+            organization_id,
+            [day_ranges[0] for day_ranges in batch_ranges],
+        )
+        batch_sets = [
+            None
+            if first_result is None
+            else complete_contributions(
+                query_str,
+                contributor,
+                organization_id,
+                day_ranges,
+                first_result,
+                range_executor,
+            )
+            for contributor, day_ranges, first_result in zip(
+                batch, batch_ranges, first_results
+            )
+        ]
+        if checkpoint is not None:
+            checkpoint.save_contributions(batch, batch_sets)
+        return batch_sets
+
+    batch_size = max(min(batch_size, max_batch_size(query_str, organization_id)), 1)
+
+    # Queries every contributor and returns the ones that failed
+    def query_all(contributors):
+        batches = []
+        batch = []
+        for contributor in contributors:
+            if contributor["login"] in contribution_sets:
+                continue
+            batch.append(contributor)
+            if len(batch) == batch_size:
+                batches.append((batch, executor.submit(query_batch, batch)))
+                batch = []
+        if batch:
+            batches.append((batch, executor.submit(query_batch, batch)))
+        failed = []
+        for batch, future in batches:
+            for contributor, contribution_set in zip(batch, future.result()):
+                if contribution_set is None:
+                    failed.append(contributor)
+                else:
+                    contribution_sets[contributor["login"]] = contribution_set
+        return failed
+
+    # Batches wait for their ranges, so the ranges get threads of their own
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(workers, 1)
+    ) as executor, concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(RANGE_WORKERS, 1)
+    ) as range_executor:
+        failed = query_all(contributors)
+        for requeue in range(MAX_REQUEUES):
+            if not failed:
+                break
+            telemetry.count("requeued_contributors", len(failed))
+            # Give whatever made them fail time to pass
+            delay = retry_policy.delay(retry_policy.max_retries)
+            telemetry.progress(
+                "Querying {} contributors again in {:.1f}s".format(len(failed), delay)
+            )
+            time.sleep(delay)
+            # Each pass gets a full budget, so the retries of the last one
+            # don't leave it a single attempt per query
+            retry_policy.refill()
+            failed = query_all(failed)
+    if failed:
+        telemetry.count("failed_contributors", len(failed))
+    return contribution_sets
+
+
+# Merges the contribution sets of gather_contributions in contributor_list order
+# Contributors that couldn't be queried have no contributions
+def ordered_contributions(contribution_sets, contributor_list):
+    last_contribution_set = new_contribution_set()
+    for contributor in contributor_list:
+        if contributor["login"] in contribution_sets:
+            merge_contribution_set(
+                last_contribution_set, contribution_sets[contributor["login"]]
             )
     return last_contribution_set
 
 
+# Gets the time to query each contributor's contributions from, using the time
+# of their last query in high_water_marks
+# Contributions are only stored by day, so the day of the last query is queried
+# again in full. Contributors without a high water mark, and every contributor
+# in a full run, are queried from since
+def incremental_windows(high_water_marks, since):
+    windows = collections.defaultdict(lambda: since.strftime("%Y-%m-%dT00:00:00Z"))
+    for contributor_login, high_water_mark in high_water_marks.items():
+        windows[contributor_login] = "{}T00:00:00Z".format(high_water_mark[0:10])
+    return windows
+
+
+# Merges the contributions of an incremental run into the last full data set
+# Each contributor keeps their old contributions from before their window and
+# gets the new ones from inside it, so days that were queried twice aren't
+# counted twice. Contributors that are no longer in contributor_list are dropped,
+# and the ones in failed_logins, that couldn't be queried, keep all their old
+# contributions
+def merge_incremental(
+    old_contribution_set,
+    new_contribution_set,
+    contributor_list,
+    windows,
+    failed_logins=(),
+):
+    keys = list(new_contribution_set.keys())
+    date_index = keys.index("date")
+    old_rows = collections.defaultdict(list)
+    for row in zip(*[old_contribution_set[key] for key in keys]):
+        old_rows[row[0]].append(row)
+    new_rows = collections.defaultdict(list)
+    for row in zip(*[new_contribution_set[key] for key in keys]):
+        new_rows[row[0]].append(row)
+
+    merged_contribution_set = {key: [] for key in keys}
+    for contributor in contributor_list:
+        contributor_login = contributor["login"]
+        window_date = windows[contributor_login][0:10]
+        rows = [
+            (contributor_login, contributor["name"]) + row[2:]
+            for row in old_rows[contributor_login]
+            if row[date_index] < window_date or contributor_login in failed_logins
+        ] + new_rows[contributor_login]
+        for row in rows:
+            for key, value in zip(keys, row):
+                merged_contribution_set[key].append(value)
+    return merged_contribution_set
+
+
 # =====================================
 # Format of final_collab_dict
 # =====================================
@@ -3,10 +3,16 @@
 # =====================================
 
 collaborators = """{{
+    rateLimit {{
+        cost
+        remaining
+        resetAt
+    }}
     organization(login: "{}") {{
         repositories(first: 100{}){{
             pageInfo{{
                 endCursor
+                hasNextPage
             }}
             edges {{
                 node {{
@@ -15,6 +21,7 @@ collaborators = """{{
                         totalCount
                         pageInfo{{
                             endCursor
+                            hasNextPage
                         }}
                         edges {{
                             node{{
@@ -31,11 +38,17 @@ collaborators = """{{
 """
 
 single_repo = """{{
+    rateLimit {{
+        cost
+        remaining
+        resetAt
+    }}
     organization(login: "{}") {{
         repository(name: "{}"){{
             collaborators(first: 100, after: "{}"){{
                 pageInfo{{
                     endCursor
+                    hasNextPage
                 }}
                 edges{{
                     node{{
@@ -55,10 +68,16 @@ single_repo = """{{
 # =====================================
 
 teams = """{{
+    rateLimit {{
+        cost
+        remaining
+        resetAt
+    }}
     organization(login:"{}"){{
-        teams(first: 100){{
+        teams(first: 100{}){{
             pageInfo{{
                 endCursor
+                hasNextPage
             }}
             edges{{
                 node{{
@@ -67,6 +86,7 @@ teams = """{{
                         totalCount
                         pageInfo{{
                             endCursor
+                            hasNextPage
                         }}
                         edges{{
                             node{{
@@ -79,6 +99,7 @@ teams = """{{
                         totalCount
                         pageInfo{{
                             endCursor
+                            hasNextPage
                         }}
                         edges{{
                             node{{
@@ -94,11 +115,17 @@ teams = """{{
 """
 
 single_team_members = """{{
+    rateLimit {{
+        cost
+        remaining
+        resetAt
+    }}
     organization(login: "{}") {{
         team(slug: "{}") {{
             members(first:100, after: "{}"){{
                 pageInfo{{
                     endCursor
+                    hasNextPage
                 }}
                 edges{{
                     node{{
@@ -113,11 +140,17 @@ single_team_members = """{{
 """
 
 single_team_repos = """{{
+    rateLimit {{
+        cost
+        remaining
+        resetAt
+    }}
     organization(login: "{}"){{
         team(slug: "{}"){{
             repositories(first:100, after: "{}"){{
                 pageInfo{{
                     endCursor
+                    hasNextPage
                 }}
                 edges{{
                     node{{
@@ -136,75 +169,118 @@ single_team_repos = """{{
 # =====================================
 
 organization_id = """{{
+    rateLimit {{
+        cost
+        remaining
+        resetAt
+    }}
     organization(login: "{}") {{
         id
     }}
 }}
 """
 
-last_contribution = """{{
-    user(login: "{}") {{
-        contributionsCollection(organizationID: "{}") {{
-            hasAnyContributions
-            contributionCalendar {{
-                totalContributions
+# A single user's contributions, selected under the alias u<number> so that
+# many users can be put into the same query
+# The last argument is a time range (', from: "...", to: "..."') of at most a year
+user_contributions = """u{}: user(login: "{}") {{
+    contributionsCollection(organizationID: "{}"{}) {{
+        hasAnyContributions
+        contributionCalendar {{
+            totalContributions
+        }}
+        commitContributionsByRepository(maxRepositories: 100) {{
+            repository {{
+                name
             }}
-            commitContributionsByRepository(maxRepositories: 100) {{
-                repository {{
-                    name
+            contributions(first: 100) {{
+                totalCount
+                pageInfo{{
+                    endCursor
+                    hasNextPage
                 }}
-                contributions(first: 100) {{
-                    totalCount
-                    pageInfo{{
-                        endCursor
-                    }}
-                    edges {{
-                        node {{
-                            occurredAt
-                        }}
+                edges {{
+                    node {{
+                        occurredAt
                     }}
                 }}
             }}
-            issueContributionsByRepository(maxRepositories: 100) {{
-                repository {{
-                    name
+        }}
+        issueContributionsByRepository(maxRepositories: 100) {{
+            repository {{
+                name
+            }}
+            contributions(first: 100) {{
+                totalCount
+                pageInfo{{
+                    endCursor
+                    hasNextPage
                 }}
-                contributions(first: 100) {{
-                    totalCount
-                    pageInfo{{
-                        endCursor
-                    }}
-                    edges {{
-                        node {{
-                            occurredAt
-                        }}
+                edges {{
+                    node {{
+                        occurredAt
                     }}
                 }}
             }}
-            pullRequestContributionsByRepository(maxRepositories: 100) {{
-                repository {{
-                    name
+        }}
+        pullRequestContributionsByRepository(maxRepositories: 100) {{
+            repository {{
+                name
+            }}
+            contributions(first: 100) {{
+                totalCount
+                pageInfo{{
+                    endCursor
+                    hasNextPage
                 }}
-                contributions(first: 100) {{
-                    totalCount
-                    pageInfo{{
-                        endCursor
+                edges {{
+                    node {{
+                        occurredAt
                     }}
-                    edges {{
-                        node {{
-                            occurredAt
-                        }}
+                }}
+            }}
+        }}
+        pullRequestReviewContributionsByRepository(maxRepositories: 100) {{
+            repository {{
+                name
+            }}
+            contributions(first: 100) {{
+                totalCount
+                pageInfo{{
+                    endCursor
+                    hasNextPage
+                }}
+                edges {{
+                    node {{
+                        occurredAt
                     }}
                 }}
             }}
-            pullRequestReviewContributionsByRepository(maxRepositories: 100) {{
+        }}
+    }}
+}}
+"""
+
+# The page after a cursor of a user's contributions of one type in each
+# repository, e.g. commitContributionsByRepository
+# The arguments are the login, organization id, time range, type and cursor
+user_contribution_pages = """{{
+    rateLimit {{
+        cost
+        remaining
+        resetAt
+    }}
+    user(login: "{}") {{
+        contributionsCollection(organizationID: "{}"{}) {{
+            {}(maxRepositories: 100) {{
                 repository {{
                     name
                 }}
-                contributions(first: 100) {{
+                contributions(first: 100, after: "{}") {{
                     totalCount
                     pageInfo{{
                         endCursor
+                        hasNextPage
                     }}
                     edges {{
                         node {{
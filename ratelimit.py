@@ -0,0 +1,155 @@
+import time
+import datetime
+import threading
+import email.utils
+
+# Once less than this fraction of the hourly budget is left, queries are spread
+# out evenly until the budget resets instead of being sent back to back
+LOW_BUDGET = 0.1
+# Seconds added to every wait to make up for GitHub's clock resolution
+MARGIN = 1
+# Seconds to wait after a secondary rate limit that doesn't say how long to wait
+SECONDARY_WAIT = 60
+
+
+# Converts a GraphQL DateTime ("2019-08-01T12:00:00Z") to epoch seconds
+def parse_datetime(value):
+    date = datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+    return date.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+# Keeps a live view of the GitHub rate limit budget and paces queries to it
+# The budget is read from the X-RateLimit-* headers and the rateLimit field of
+# every response. All threads share one RateLimiter, so points are reserved when
+# a query is sent and the budget can't be overspent by queries in flight
+class RateLimiter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.limit = None
+        self.remaining = None
+        # Epoch seconds (GitHub's clock) when the budget is refilled
+        self.reset_at = None
+        # Cost of the most recent query, used as the cost of the next one
+        self.cost = 1
+        # Seconds that GitHub's clock is ahead of ours
+        self.clock_offset = 0
+        # Epoch seconds (our clock) before which nothing may be sent
+        self.paused_until = 0
+        self.next_query = 0
+        self.waited = 0
+
+    # Blocks until the next query can be sent
+    def wait(self):
+        while True:
+            with self.lock:
+                now = time.time()
+                delay = self.delay(now)
+                if delay <= 0:
+                    if self.remaining is not None:
+                        self.remaining -= self.cost
+                    self.next_query = now + self.interval(now)
+                    return
+                self.waited += delay
+            time.sleep(delay)
+
+    # Gives back the points wait() reserved for a query that failed without
+    # reporting the budget, e.g. a 502 or a timeout, so retries don't use up
+    # budget that was never spent
+    def refund(self):
+        with self.lock:
+            if self.remaining is not None:
+                self.remaining += self.cost
+
+    # Gets the number of seconds to wait before sending a query
+    def delay(self, now):
+        # Secondary rate limit
+        if self.paused_until > now:
+            return self.paused_until - now
+        # Out of budget, wait until it is reset
+        if self.remaining is not None and self.remaining < self.cost:
+            # No reset time was given, check again in a minute
+            if self.reset_at is None:
+                self.remaining = None
+                self.paused_until = now + 60
+                return 60
+            reset_at = self.local_reset_at()
+            if reset_at > now:
+                return reset_at - now
+            self.remaining = None
+        return self.next_query - now
+
+    # Gets the number of seconds to leave between queries
+    # Queries are sent as fast as possible while the budget is healthy. Once it
+    # runs low, what's left is spread over the time until reset
+    def interval(self, now):
+        if self.remaining is None or self.limit is None or self.reset_at is None:
+            return 0
+        if self.remaining > self.limit * LOW_BUDGET:
+            return 0
+        queries_left = max(self.remaining / max(self.cost, 1), 1)
+        return max(self.local_reset_at() - now, 0) / queries_left
+
+    def local_reset_at(self):
+        return self.reset_at - self.clock_offset + MARGIN
+
+    # Updates the budget from the X-RateLimit-* and Date headers of a response
+    def update_headers(self, headers):
+        with self.lock:
+            if "Date" in headers:
+                server_time = email.utils.parsedate_to_datetime(headers["Date"])
+                self.clock_offset = server_time.timestamp() - time.time()
+            if "X-RateLimit-Limit" in headers:
+                self.limit = int(headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Remaining" in headers and "X-RateLimit-Reset" in headers:
+                self.set_budget(
+                    int(headers["X-RateLimit-Remaining"]),
+                    int(headers["X-RateLimit-Reset"]),
+                )
+
+    # Updates the budget from the rateLimit field of a GraphQL result
+    def update_result(self, result):
+        rate_limit = (result.get("data") or {}).get("rateLimit")
+        if not rate_limit:
+            return
+        with self.lock:
+            self.cost = max(rate_limit["cost"], 1)
+            self.set_budget(rate_limit["remaining"], parse_datetime(rate_limit["resetAt"]))
+
+    # Responses can arrive out of order, so within one reset window the lowest
+    # remaining budget is the most recent
+    def set_budget(self, remaining, reset_at):
+        if self.reset_at is None or reset_at > self.reset_at:
+            self.reset_at = reset_at
+            self.remaining = remaining
+        elif reset_at == self.reset_at:
+            if self.remaining is None:
+                self.remaining = remaining
+            else:
+                self.remaining = min(self.remaining, remaining)
+
+    # Checks a response for a primary or secondary rate limit, and if it hit one,
+    # holds back every query until the limit has passed
+    def limited(self, response):
+        headers = response.headers
+        if response.status_code not in (403, 429):
+            return False
+        with self.lock:
+            if "Retry-After" in headers:
+                self.paused_until = time.time() + int(headers["Retry-After"])
+                return True
+            if headers.get("X-RateLimit-Remaining") == "0":
+                self.remaining = 0
+                return True
+            if b"secondary rate limit" in response.content.lower():
+                self.paused_until = time.time() + SECONDARY_WAIT
+                return True
+        return False
+
+    # Checks a GraphQL result for a RATE_LIMITED error
+    def limited_result(self, result):
+        for error in result.get("errors") or []:
+            if error.get("type") == "RATE_LIMITED":
+                with self.lock:
+                    self.remaining = 0
+                return True
+        return False
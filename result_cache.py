@@ -0,0 +1,180 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+import functools
+import collections
+
+
+# Converts callback inputs to a hashable key
+# Lists become tuples and dictionaries become sorted tuples. Empty values (None,
+# [] or "") all mean the same thing to the callbacks, so they share a key
+def normalize(value):
+    if value is None or value == [] or value == "" or value == {}:
+        return None
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, normalize(item)) for key, item in value.items()))
+    return value
+
+
+# Results stored in an SQLite file, so that every worker process on the machine
+# can use results computed by the others
+class DiskStore:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.execute(
+            lambda connection: connection.execute(
+                "CREATE TABLE IF NOT EXISTS results"
+                " (key TEXT PRIMARY KEY, value BLOB, size INTEGER, accessed REAL)"
+            )
+        )
+
+    # Runs statements in a transaction on a new connection, connections can't be
+    # shared between threads
+    def execute(self, statements):
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            with connection:
+                return statements(connection)
+        finally:
+            connection.close()
+
+    def get(self, key):
+        def statements(connection):
+            row = connection.execute(
+                "SELECT value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            return bytes(row[0])
+
+        return self.execute(statements)
+
+    def put(self, key, value):
+        def statements(connection):
+            connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), time.time()),
+            )
+            # Evict the least recently used results over max_bytes
+            total_bytes = connection.execute(
+                "SELECT SUM(size) FROM results"
+            ).fetchone()[0]
+            if total_bytes <= self.max_bytes:
+                return
+            evicted = []
+            for old_key, size in connection.execute(
+                "SELECT key, size FROM results ORDER BY accessed"
+            ).fetchall():
+                if total_bytes <= self.max_bytes:
+                    break
+                evicted.append((old_key,))
+                total_bytes -= size
+            connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+
+        self.execute(statements)
+
+
+# Memoizes callback results
+# Results are keyed on the callback name, the normalized inputs and the version
+# of the data, so a new version of the data never gets old results. The cache
+# holds at most max_entries results and max_bytes of pickled results, and
+# evicts the least recently used, a max_entries of 0 turns it off. With
+# disk_path, results are also shared with other processes through a DiskStore
+class ResultCache:
+    def __init__(self, data_version, max_entries, max_bytes, disk_path=None):
+        # Function that gets the current version of the data
+        self.data_version = data_version
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk = DiskStore(disk_path, max_bytes) if disk_path else None
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.total_bytes = 0
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return pickle.loads(self.entries[key])
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.remember(key, value)
+                return pickle.loads(value)
+        raise KeyError(key)
+
+    def put(self, key, result):
+        value = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        self.remember(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    # Adds a pickled result to memory and evicts down to the limits
+    def remember(self, key, value):
+        # Results bigger than the whole cache aren't kept
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= len(self.entries.pop(key))
+            self.entries[key] = value
+            self.total_bytes += len(value)
+            while (
+                len(self.entries) > self.max_entries
+                or self.total_bytes > self.max_bytes
+            ):
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    # Decorator that memoizes a callback
+    # With no entries and no DiskStore nothing could be kept, so the callback is
+    # left as it is instead of paying for keys and pickles
+    def memoize(self, func):
+        if self.max_entries <= 0 and self.disk is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            key_parts = (func.__name__, self.data_version(), normalize(args))
+            key = hashlib.sha1(repr(key_parts).encode()).hexdigest()
+            try:
+                result = self.get(key)
+                with self.lock:
+                    self.hits[func.__name__] += 1
+                return result
+            except KeyError:
+                with self.lock:
+                    self.misses[func.__name__] += 1
+            result = func(*args)
+            self.put(key, result)
+            return result
+
+        return wrapper
+
+    # Gets the hits, misses and hit rate of each callback
+    def stats(self):
+        callbacks = {}
+        for name in set(self.hits) | set(self.misses):
+            total = self.hits[name] + self.misses[name]
+            callbacks[name] = {
+                "hits": self.hits[name],
+                "misses": self.misses[name],
+                "hit_rate": self.hits[name] / total if total else 0,
+            }
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "callbacks": callbacks,
+        }
@@ -0,0 +1,145 @@
+import time
+import random
+import threading
+
+import requests
+
+# Kinds of failed queries
+# Sending the query again can succeed after any of these
+TRANSIENT = "transient"
+TIMEOUT = "timeout"
+SECONDARY_RATE_LIMIT = "secondary rate limit"
+GRAPHQL = "graphql"
+# The primary rate limit is waited out by the RateLimiter, it isn't a failure
+RATE_LIMIT = "rate limit"
+# Sending the query again will fail the same way, e.g. a bad API key
+HARD = "hard"
+
+# Statuses of GitHub's servers failing or timing out
+TRANSIENT_STATUSES = (500, 502, 503, 504)
+# GraphQL error types that will be the same however many times a query is sent
+PERMANENT_ERROR_TYPES = {
+    "NOT_FOUND",
+    "FORBIDDEN",
+    "UNAUTHORIZED",
+    "MAX_NODE_LIMIT_EXCEEDED",
+    "EXCESSIVE_PAGINATION",
+}
+# Seconds of the first backoff, and most seconds of any backoff
+BASE_DELAY = 1
+MAX_DELAY = 60
+
+
+# Raised when a query failed and won't be sent again
+class QueryFailed(Exception):
+    def __init__(self, message, kind):
+        super().__init__(message)
+        self.kind = kind
+
+    # Whether the query could succeed if it is sent again later
+    @property
+    def retriable(self):
+        return self.kind != HARD
+
+
+# Gets the kind of failure of an exception raised while sending a query
+def classify_exception(exception):
+    if isinstance(exception, requests.Timeout):
+        return TIMEOUT
+    return TRANSIENT
+
+
+# Gets the kind of failure of a response that isn't a 200
+def classify_response(response):
+    if response.status_code in TRANSIENT_STATUSES:
+        return TRANSIENT
+    if response.status_code in (403, 429):
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            return RATE_LIMIT
+        if (
+            "Retry-After" in response.headers
+            or b"secondary rate limit" in response.content.lower()
+        ):
+            return SECONDARY_RATE_LIMIT
+    # Too many requests is always worth sending again later, only a 403 without
+    # any sign of a rate limit is a permission problem
+    if response.status_code == 429:
+        return SECONDARY_RATE_LIMIT
+    return HARD
+
+
+# Whether a GraphQL result has any data besides the rateLimit every query selects
+def has_data(result):
+    data = result.get("data") or {}
+    return any(value is not None for key, value in data.items() if key != "rateLimit")
+
+
+# Whether any of the errors of a result will be the same however many times the
+# query is sent, e.g. a user that doesn't exist
+def permanent_errors(errors):
+    return any(error.get("type") in PERMANENT_ERROR_TYPES for error in errors)
+
+
+# Whether a GraphQL result should be sent again because of its errors
+# Results with some data are returned, the caller decides what to do with the
+# parts that failed. Results without any are sent again, unless an error is one
+# that sending the query again won't fix
+def retriable_errors(result):
+    errors = result.get("errors")
+    if not errors or has_data(result):
+        return False
+    return not permanent_errors(errors)
+
+
+# Exponential backoff with full jitter, and a budget that keeps retries to a
+# fraction of the queries sent
+# Each failed query waits a random time of up to twice as long as its last wait
+# before it is sent again, up to max_retries times. Every query adds ratio of a
+# retry to the budget, and every second adds refill_rate, up to budget_size.
+# Every retry takes a whole one, so when many queries fail at once they stop
+# being retried instead of piling more load onto GitHub, and once the burst is
+# over retries are allowed again. All threads share one RetryPolicy
+class RetryPolicy:
+    def __init__(self, max_retries, ratio, budget_size, refill_rate):
+        self.max_retries = max_retries
+        self.ratio = ratio
+        self.budget_size = budget_size
+        self.refill_rate = refill_rate
+        self.lock = threading.Lock()
+        self.budget = budget_size
+        self.refilled = time.monotonic()
+        self.random = random.Random()
+
+    # Gets the seconds to wait before a query is sent again for the retry-th time
+    def delay(self, retry):
+        with self.lock:
+            return self.random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** retry))
+
+    # Adds the retries earned since the budget was last refilled, with the lock held
+    def add_elapsed(self):
+        now = time.monotonic()
+        self.budget = min(
+            self.budget + (now - self.refilled) * self.refill_rate, self.budget_size
+        )
+        self.refilled = now
+
+    # Adds a new query to the budget
+    def deposit(self):
+        with self.lock:
+            self.add_elapsed()
+            self.budget = min(self.budget + self.ratio, self.budget_size)
+
+    # Takes a retry from the budget, returns False if there are none left
+    def withdraw(self):
+        with self.lock:
+            self.add_elapsed()
+            if self.budget < 1:
+                return False
+            self.budget -= 1
+            return True
+
+    # Fills the budget back up, e.g. before queries that failed are sent again
+    def refill(self):
+        with self.lock:
+            self.budget = self.budget_size
+            self.refilled = time.monotonic()
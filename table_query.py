@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+# DataTable filter operators and the symbols that can be typed for them
+# Longer symbols come first so that "<=" isn't read as "<"
+operators = [
+    ["ge ", ">="],
+    ["le ", "<="],
+    ["lt ", "<"],
+    ["gt ", ">"],
+    ["ne ", "!="],
+    ["eq ", "="],
+    ["contains "],
+    ["datestartswith "],
+]
+
+
+# Splits one part of a filter query ("{column} operator value") into the column
+# name, the operator and the value
+# The column comes first, so only the start of the rest can be the operator and
+# a value like "a <= b" is read as a value
+def split_filter_part(filter_part):
+    filter_part = filter_part.strip()
+    if not filter_part.startswith("{") or "}" not in filter_part:
+        return None, None, None
+    name, rest = filter_part[1:].split("}", 1)
+    rest = rest.lstrip() + " "
+    for operator_type in operators:
+        for operator in operator_type:
+            if rest.startswith(operator):
+                value_part = rest[len(operator) :].strip()
+                if not value_part:
+                    return name, operator_type[0].strip(), ""
+                quote = value_part[0]
+                if (
+                    len(value_part) > 1
+                    and quote == value_part[-1]
+                    and quote in ("'", '"', "`")
+                ):
+                    value = value_part[1:-1].replace("\\" + quote, quote)
+                else:
+                    value = value_part
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+
+# Gets a boolean mask of the rows of a column that match one filter
+def filter_mask(column, operator, value):
+    # Categorical columns are filtered on their categories, and each row gets
+    # the result of its category
+    if isinstance(column.dtype, pd.api.types.CategoricalDtype):
+        category_mask = filter_mask(
+            pd.Series(column.cat.categories), operator, value
+        ).values
+        # Missing values have the code -1, and never match
+        matches = np.append(category_mask, False)
+        return pd.Series(matches[column.cat.codes.values], index=column.index)
+    # Datetime columns are compared against the value as a datetime, and
+    # matched as "YYYY-MM-DD" text by the string operators and by values that
+    # aren't dates
+    if pd.api.types.is_datetime64_any_dtype(column):
+        dates = column.dt.strftime("%Y-%m-%d")
+        if operator in ("contains", "datestartswith"):
+            return filter_mask(dates, operator, value)
+        try:
+            value = pd.Timestamp(value)
+        except ValueError:
+            return filter_mask(dates, operator, value)
+    if operator == "contains":
+        return column.str.contains(value, regex=False, na=False)
+    if operator == "datestartswith":
+        return column.str.startswith(value, na=False)
+    # Only compare the values that are there, missing values never match
+    present = column.notnull()
+    values = column[present]
+    comparisons = {
+        "eq": values.eq,
+        "ne": values.ne,
+        "lt": values.lt,
+        "le": values.le,
+        "gt": values.gt,
+        "ge": values.ge,
+    }
+    mask = pd.Series(False, index=column.index)
+    mask[present] = comparisons[operator](value).astype(bool)
+    return mask
+
+
+# Filters a DataFrame with a DataTable filter query
+# e.g. '{repo_name} eq "GitHubble" && {date} >= "2019-08-01"'
+def filter_frame(frame, filter_query):
+    if not filter_query:
+        return frame
+    for filter_part in filter_query.split(" && "):
+        name, operator, value = split_filter_part(filter_part)
+        if name not in frame.columns:
+            continue
+        frame = frame[filter_mask(frame[name], operator, value).values]
+    return frame
+
+
+# Sorts a DataFrame with a DataTable sort_by
+# e.g. [{"column_id": "date", "direction": "desc"}]
+def sort_frame(frame, sort_by):
+    sort_by = [sort for sort in sort_by or [] if sort["column_id"] in frame.columns]
+    if not sort_by:
+        return frame
+    return frame.sort_values(
+        [sort["column_id"] for sort in sort_by],
+        ascending=[sort["direction"] == "asc" for sort in sort_by],
+        kind="mergesort",
+    )
+
+
+# Gets the rows of one page of a DataTable, after filtering and sorting
+# A page past the end shows the last page
+def table_page(frame, page_current, page_size, sort_by, filter_query):
+    frame = sort_frame(filter_frame(frame, filter_query), sort_by)
+    page_size = page_size or 10
+    last_page = max((len(frame.index) - 1) // page_size, 0)
+    start = min(page_current or 0, last_page) * page_size
+    return frame.iloc[start : start + page_size].to_dict("records")
+
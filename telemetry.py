@@ -0,0 +1,110 @@
+import json
+import time
+import datetime
+import threading
+import contextlib
+import collections
+
+
+# Gets the value below which a fraction of the sorted values fall
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    position = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[position]
+
+
+# Measurements of a gatherData.py run
+# Every query records its latency, rate limit cost, response size and retries
+# under the name of what it queries, and each phase of the run records how long
+# it took. With quiet, progress messages aren't printed, only the time each
+# phase took
+class RunTelemetry:
+    def __init__(self, quiet=False):
+        self.quiet = quiet
+        self.lock = threading.Lock()
+        # Held while printing, so messages from several threads don't mix
+        self.print_lock = threading.Lock()
+        self.started = datetime.datetime.utcnow()
+        # Seconds each request took, by query name
+        self.latencies = collections.defaultdict(list)
+        # Totals by query name
+        self.queries = collections.defaultdict(collections.Counter)
+        # Seconds each phase took, in the order they finished
+        self.phases = collections.OrderedDict()
+        # Other totals, e.g. how many times a batch was split
+        self.counters = collections.Counter()
+
+    # Prints a progress message, unless quiet
+    def progress(self, message):
+        if not self.quiet:
+            with self.print_lock:
+                print(message)
+
+    # Records one request of a query
+    # retries is 1 if the request resent a query that failed or was rate limited
+    def record_query(self, name, seconds, cost, response_bytes, retries, failed=False):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            totals = self.queries[name]
+            totals["requests"] += 1
+            totals["cost"] += cost
+            totals["response_bytes"] += response_bytes
+            totals["retries"] += retries
+            totals["failures"] += 1 if failed else 0
+
+    # Adds to one of the other totals
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    # Times a phase of the run
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        self.progress("Started {}".format(name))
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0) + seconds
+            with self.print_lock:
+                print("Finished {} in {:.1f}s".format(name, seconds))
+
+    # Gets everything recorded in a form that can be saved as JSON
+    def report(self, **extra):
+        with self.lock:
+            queries = {}
+            totals = collections.Counter()
+            for name, query_totals in self.queries.items():
+                latencies = sorted(self.latencies[name])
+                totals.update(query_totals)
+                queries[name] = dict(query_totals)
+                queries[name]["latency"] = {
+                    "total": sum(latencies),
+                    "mean": sum(latencies) / len(latencies),
+                    "p50": percentile(latencies, 0.5),
+                    "p95": percentile(latencies, 0.95),
+                    "max": latencies[-1],
+                }
+            report = {
+                "started": self.started.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "finished": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "phases": dict(self.phases),
+                "queries": queries,
+                "totals": dict(totals),
+                "counters": dict(self.counters),
+            }
+        report.update(extra)
+        return report
+
+    # Saves the report of the run to report_path, and appends it as one line to
+    # history_path so runs can be compared
+    def save_report(self, report_path, history_path, **extra):
+        report = self.report(**extra)
+        with open(report_path, "w+") as f:
+            json.dump(report, f, indent=2)
+        with open(history_path, "a") as f:
+            f.write(json.dumps(report) + "\n")
+        return report
@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from result_cache import ResultCache
+
+
+def double(value):
+    double.calls += 1
+    return value * 2
+
+
+def test_memoize_is_skipped_without_entries():
+    result_cache = ResultCache(lambda: 1, 0, 1024)
+    assert result_cache.memoize(double) is double
+    assert result_cache.stats()["callbacks"] == {}
+
+
+def test_memoize_caches_with_entries():
+    double.calls = 0
+    result_cache = ResultCache(lambda: 1, 2, 1024)
+    memoized = result_cache.memoize(double)
+    assert memoized is not double
+    assert memoized(2) == 4
+    assert memoized(2) == 4
+    assert double.calls == 1
+    assert result_cache.stats()["callbacks"]["double"]["hits"] == 1
+
+
+def test_memoize_keeps_the_disk_store_without_entries(tmp_path):
+    double.calls = 0
+    disk_path = str(tmp_path / "results.sqlite")
+    result_cache = ResultCache(lambda: 1, 0, 1024, disk_path)
+    memoized = result_cache.memoize(double)
+    assert memoized is not double
+    assert memoized(3) == 6
+    assert memoized(3) == 6
+    assert double.calls == 1
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import table_query
+
+
+def test_split_filter_part():
+    filter_parts = {
+        '{contributor_name} eq "Kyle Smith"': ("contributor_name", "eq", "Kyle Smith"),
+        '{repo_name} contains "a=b"': ("repo_name", "contains", "a=b"),
+        '{repo_name} = "x <= y"': ("repo_name", "eq", "x <= y"),
+        '{date} >= "2019-08-01"': ("date", "ge", "2019-08-01"),
+        "{date} < 2019-08-01": ("date", "lt", "2019-08-01"),
+        "{login} ne ann": ("login", "ne", "ann"),
+        '{name} contains "say \\"hi\\""': ("name", "contains", 'say "hi"'),
+        "{date} datestartswith 2019-08": ("date", "datestartswith", "2019-08"),
+        "{name} contains": ("name", "contains", ""),
+        "name eq ann": (None, None, None),
+    }
+    for filter_part, expected in filter_parts.items():
+        assert table_query.split_filter_part(filter_part) == expected, filter_part
+
+
+def test_filter_frame_on_strings():
+    frame = pd.DataFrame({"contributor_name": ["Kyle Smith", "Ann Lee"]})
+    filtered = table_query.filter_frame(frame, '{contributor_name} eq "Kyle Smith"')
+    assert list(filtered.contributor_name) == ["Kyle Smith"]
+
+
+def test_filter_frame_contains_on_datetimes():
+    frame = pd.DataFrame(
+        {
+            "datetime_date": pd.to_datetime(
+                ["2019-08-01", "2020-01-15", None, "2018-12-31"]
+            )
+        }
+    )
+    filtered = table_query.filter_frame(frame, '{datetime_date} contains "2019"')
+    assert list(filtered.index) == [0]
+    filtered = table_query.filter_frame(frame, '{datetime_date} contains "-01-"')
+    assert list(filtered.index) == [1]
+
+
+def test_filter_frame_compares_datetimes():
+    frame = pd.DataFrame(
+        {"datetime_date": pd.to_datetime(["2019-08-01", "2020-01-15", None])}
+    )
+    filtered = table_query.filter_frame(frame, '{datetime_date} >= "2019-09-01"')
+    assert list(filtered.index) == [1]
+    filtered = table_query.filter_frame(frame, '{datetime_date} eq "not a date"')
+    assert filtered.empty
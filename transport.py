@@ -0,0 +1,43 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Reusable HTTP transport for the GitHub GraphQL API
+# Connections are kept alive in a shared pool, so queries after the first don't
+# pay for a new TCP and TLS handshake. Responses are gzip compressed and decoded
+# by requests
+class Transport:
+    def __init__(self, url, headers, pool_size, connect_timeout, read_timeout):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # Block instead of opening throwaway connections when every pooled
+        # connection is busy
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(headers)
+        self.session.headers.update(
+            {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+        )
+
+    # Sends a GraphQL query and returns the response
+    def post(self, query):
+        return self.session.post(self.url, json={"query": query}, timeout=self.timeout)
+
+    # Gets the number of requests sent and connections opened so far
+    def stats(self):
+        requests_sent = 0
+        connections = 0
+        adapters = {id(adapter): adapter for adapter in self.session.adapters.values()}
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                requests_sent += pool.num_requests
+                connections += pool.num_connections
+        return {
+            "requests": requests_sent,
+            "connections": connections,
+            "reused": max(requests_sent - connections, 0),
+        }